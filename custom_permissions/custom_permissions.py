@@ -1,7 +1,13 @@
+from django.core.cache import cache
+from django.http import Http404
 from rest_framework import permissions
+from rest_framework.generics import get_object_or_404
 
 from devices.models import Device
 
+# Owners only change on claim and release, and both drop the entry, so it can live for a while
+DEVICE_OWNER_CACHE_TIMEOUT = 300
+
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -27,9 +33,44 @@ class IsDeviceOwner(permissions.BasePermission):
         if not device_id:
             return False
 
-        # Check if the user is the owner of this device
-        try:
-            device = Device.objects.get(id=device_id)
-            return device.user == request.user
-        except Device.DoesNotExist:
-            return False
+        # Check if the user is the owner of this device, keeping the device on the request for the view
+        device = Device.objects.filter(id=device_id).first()
+        request.device = device
+        return device is not None and device.user_id == request.user.id
+
+
+def get_owned_device(request, device_id):
+    """
+    Return the device IsDeviceOwner already loaded for this request,
+    falling back to a lookup when the view runs without that permission.
+    """
+    device = getattr(request, "device", None)
+    if device is not None and str(device.id) == str(device_id):
+        return device
+    return get_object_or_404(Device, id=device_id)
+
+
+def _device_owner_cache_key(device_id):
+    return f"device_owner:{device_id}"
+
+
+def get_device_owner_id(device_id):
+    """
+    Return the id of the user owning a device (None while it is unclaimed), cached between requests.
+    Raises Http404 for an unknown device.
+    """
+    cache_key = _device_owner_cache_key(device_id)
+    owner = cache.get(cache_key)
+    if owner is None:
+        owner_ids = list(Device.objects.filter(id=device_id).values_list("user_id", flat=True)[:1])
+        if not owner_ids:
+            raise Http404
+        # Cached as a 1-tuple so an unclaimed device isn't mistaken for a cache miss
+        owner = (owner_ids[0],)
+        cache.set(cache_key, owner, DEVICE_OWNER_CACHE_TIMEOUT)
+    return owner[0]
+
+
+def forget_device_owner(device_id):
+    """Drop the cached owner of a device, e.g. when it is claimed or released"""
+    cache.delete(_device_owner_cache_key(device_id))
@@ -4,12 +4,16 @@ import uuid
 from datetime import timedelta
 from urllib.parse import parse_qs
 
-from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.db import transaction
 from django.db.models import Q
 from django.utils.timezone import now
 
-from devices.models import Device, Session
+from devices.models import Device, Session, hash_api_key
+from devices.presence import remember_last_seen
+from devices.rollups import add_session_to_rollup
+from posture.authentication import forget_device_auth
 from posture.serializers.device_posture_data_serializers import PostureReadingSerializer
 
 logger = logging.getLogger(__name__)
@@ -82,6 +86,7 @@ class DeviceConsumer(AsyncWebsocketConsumer):
         try:
             self.device.last_seen = now()
             self.device.save(update_fields=["last_seen"])
+            remember_last_seen(self.device)
             return True
         except Exception as e:
             logger.error(f"Error updating last_seen: {str(e)}")
@@ -111,9 +116,10 @@ class DeviceConsumer(AsyncWebsocketConsumer):
     def get_device(self, device_id, api_key):
         try:
             device_uuid = uuid.UUID(device_id)
-            device = Device.objects.get(Q(id=device_uuid) & Q(api_key=api_key))
+            device = Device.objects.get(Q(id=device_uuid) & Q(api_key_hash=hash_api_key(api_key or "")))
             device.last_seen = now()
             device.save(update_fields=["last_seen"])
+            remember_last_seen(device)
             return device
         except (Device.DoesNotExist, ValueError):
             return None
@@ -132,6 +138,7 @@ class DeviceConsumer(AsyncWebsocketConsumer):
         try:
             self.device.last_seen = now()
             self.device.save(update_fields=["last_seen"])
+            remember_last_seen(self.device)
 
             session = Session.objects.filter(device=self.device, end_time__isnull=True).first()
             has_active_session = session is not None
@@ -220,9 +227,14 @@ class DeviceConsumer(AsyncWebsocketConsumer):
         try:
             session = Session.objects.filter(device=self.device, end_time__isnull=True).first()
             if session:
-                session.end_time = now()
-                session.is_idle = False
-                session.save(update_fields=["end_time", "is_idle"])
+                with transaction.atomic():
+                    session.end_time = now()
+                    session.is_idle = False
+                    session.save(update_fields=["end_time", "is_idle"])
+                    Device.objects.filter(pk=self.device.pk).update(in_session=False)
+                    add_session_to_rollup(self.device.pk, session.start_time, session.end_time)
+                self.device.in_session = False
+                forget_device_auth(self.device.pk)
                 return True
             return False
         except Exception as e:
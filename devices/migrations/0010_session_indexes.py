@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-15 22:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0009_session_is_idle"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="session",
+            index=models.Index(
+                fields=["device", "end_time"], name="session_dev_end_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="session",
+            index=models.Index(
+                condition=models.Q(("end_time__isnull", True)),
+                fields=["device"],
+                name="session_active_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-15 22:24
+
+from django.db import migrations, models
+
+
+def backfill_in_session(apps, schema_editor):
+    Device = apps.get_model("devices", "Device")
+    Session = apps.get_model("devices", "Session")
+
+    open_device_ids = Session.objects.filter(end_time__isnull=True).values("device_id")
+    Device.objects.filter(id__in=open_device_ids).update(in_session=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0010_session_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="device",
+            name="in_session",
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(backfill_in_session, migrations.RunPython.noop),
+    ]
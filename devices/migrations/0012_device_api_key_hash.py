@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-15 23:05
+
+from django.db import migrations, models
+
+from devices.models import hash_api_key
+
+
+def backfill_api_key_hash(apps, schema_editor):
+    Device = apps.get_model("devices", "Device")
+
+    devices = list(Device.objects.only("id", "api_key"))
+    for device in devices:
+        device.api_key_hash = hash_api_key(device.api_key)
+    Device.objects.bulk_update(devices, ["api_key_hash"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0011_device_in_session"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="device",
+            name="api_key_hash",
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+        migrations.RunPython(backfill_api_key_hash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="device",
+            name="api_key_hash",
+            field=models.CharField(editable=False, max_length=32, unique=True),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2 on 2026-10-15 23:20
+
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_rollups(apps, schema_editor):
+    Session = apps.get_model("devices", "Session")
+    HourlySessionRollup = apps.get_model("devices", "HourlySessionRollup")
+
+    totals = defaultdict(lambda: [0, 0])
+    completed = Session.objects.filter(end_time__isnull=False).values_list("device_id", "start_time", "end_time")
+    for device_id, start_time, end_time in completed.iterator(chunk_size=2000):
+        hour_start = start_time.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+        bucket = totals[device_id, hour_start]
+        bucket[0] += 1
+        bucket[1] += (end_time - start_time).total_seconds()
+
+    HourlySessionRollup.objects.bulk_create(
+        [
+            HourlySessionRollup(device_id=device_id, hour_start=hour_start, sessions=sessions, seconds=seconds)
+            for (device_id, hour_start), (sessions, seconds) in totals.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0012_device_api_key_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HourlySessionRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hour_start", models.DateTimeField()),
+                ("sessions", models.IntegerField(default=0)),
+                ("seconds", models.FloatField(default=0)),
+                (
+                    "device",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="session_rollups",
+                        to="devices.device",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("device", "hour_start"), name="rollup_device_hour_uniq"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
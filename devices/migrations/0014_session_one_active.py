@@ -0,0 +1,57 @@
+# Generated by Django 5.2 on 2026-10-15 23:40
+
+from datetime import timezone as dt_timezone
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def close_duplicate_open_sessions(apps, schema_editor):
+    Session = apps.get_model("devices", "Session")
+    HourlySessionRollup = apps.get_model("devices", "HourlySessionRollup")
+
+    # Keep the most recent open session of each device and close the older ones without a duration
+    latest_open = {}
+    duplicates = []
+    open_sessions = (
+        Session.objects.filter(end_time__isnull=True)
+        .order_by("-start_time", "-id")
+        .values_list("id", "device_id", "start_time")
+    )
+    for session_id, device_id, start_time in open_sessions:
+        if device_id in latest_open:
+            duplicates.append((session_id, device_id, start_time))
+        else:
+            latest_open[device_id] = session_id
+    Session.objects.filter(id__in=[session_id for session_id, _, _ in duplicates]).update(end_time=F("start_time"))
+
+    # The closed sessions count towards their hourly rollups like any other completed session
+    for _, device_id, start_time in duplicates:
+        hour_start = start_time.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+        HourlySessionRollup.objects.get_or_create(device_id=device_id, hour_start=hour_start)
+        HourlySessionRollup.objects.filter(device_id=device_id, hour_start=hour_start).update(
+            sessions=F("sessions") + 1
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0013_hourlysessionrollup"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="session",
+            name="session_active_idx",
+        ),
+        migrations.RunPython(close_duplicate_open_sessions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="session",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("end_time__isnull", True)),
+                fields=("device",),
+                name="session_one_active",
+            ),
+        ),
+    ]
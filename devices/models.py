@@ -1,8 +1,19 @@
+import hashlib
 import secrets
 import uuid
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from devices.presence import ALIVE_THRESHOLD_SECONDS
+
+
+def hash_api_key(api_key):
+    """Return the keyed blake2b digest stored in Device.api_key_hash for an API key"""
+    return hashlib.blake2b(api_key.encode(), key=settings.DEVICE_KEY_PEPPER.encode()[:64], digest_size=16).hexdigest()
 
 
 class Device(models.Model):
@@ -15,14 +26,28 @@ class Device(models.Model):
     vibration_intensity = models.PositiveIntegerField(default=50)
     audio_intensity = models.PositiveIntegerField(default=50)
     api_key = models.CharField(max_length=255, unique=True, editable=False)
+    # Keyed digest of api_key, used to look devices up and compare keys without the plaintext
+    api_key_hash = models.CharField(max_length=32, unique=True, editable=False)
     last_seen = models.DateTimeField(null=True, blank=True)
+    # Denormalized "has an open Session" flag, kept in sync wherever sessions start or end
+    in_session = models.BooleanField(default=False, db_index=True)
 
     def __str__(self):
         return f"{self.name} ({self.id})"
 
+    @property
+    def is_alive(self):
+        """Whether the device sent a heartbeat within the alive threshold"""
+        if not self.last_seen:
+            return False
+        return (timezone.now() - self.last_seen).total_seconds() < ALIVE_THRESHOLD_SECONDS
+
     def save(self, *args, **kwargs):
-        if not self.api_key:
-            self.api_key = secrets.token_urlsafe(48)
+        # A device loaded without its key (as authentication caches it) keeps the stored key and digest
+        if "api_key" not in self.get_deferred_fields():
+            if not self.api_key:
+                self.api_key = secrets.token_urlsafe(48)
+            self.api_key_hash = hash_api_key(self.api_key)
         super().save(*args, **kwargs)
 
 
@@ -32,6 +57,16 @@ class Session(models.Model):
     is_idle = models.BooleanField(default=False)
     end_time = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["device", "end_time"], name="session_dev_end_idx"),
+        ]
+        constraints = [
+            # A device has at most one open session; the small partial index also serves the
+            # "does this device have an open session" lookups
+            models.UniqueConstraint(fields=["device"], condition=Q(end_time__isnull=True), name="session_one_active"),
+        ]
+
     def is_active(self):
         """Returns True if the session is still ongoing"""
         return self.end_time is None
@@ -44,3 +79,20 @@ class Session(models.Model):
 
     def __str__(self):
         return f"Session for {self.device.name} starting {self.start_time}"
+
+
+class HourlySessionRollup(models.Model):
+    """Completed sessions of a device summed per UTC hour of their start time"""
+
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name="session_rollups")
+    hour_start = models.DateTimeField()
+    sessions = models.IntegerField(default=0)
+    seconds = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["device", "hour_start"], name="rollup_device_hour_uniq"),
+        ]
+
+    def __str__(self):
+        return f"Rollup for {self.device_id} at {self.hour_start}"
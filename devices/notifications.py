@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import threading
+from functools import lru_cache
+
+import msgpack
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+REDIS_PUBSUB_LAYER = "channels_redis.pubsub.RedisPubSubChannelLayer"
+IN_MEMORY_LAYER = "channels.layers.InMemoryChannelLayer"
+
+
+@lru_cache(maxsize=1)
+def _redis_client():
+    return redis.Redis.from_url(settings.REDIS_URL)
+
+
+@lru_cache(maxsize=1)
+def _notification_loop():
+    """Start the long-lived event loop that sync code hands group sends to"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="channel-layer-notifications", daemon=True).start()
+    return loop
+
+
+def _direct_publish_enabled():
+    layer_settings = settings.CHANNEL_LAYERS["default"]
+    return settings.CHANNELS_DIRECT_PUBLISH and layer_settings["BACKEND"] == REDIS_PUBSUB_LAYER
+
+
+def _log_send_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Failed to send WebSocket notification", exc_info=future.exception())
+
+
+def group_send(group_name, message):
+    """
+    Send a message to a channel layer group from synchronous code.
+
+    With the Redis pub/sub channel layer and CHANNELS_DIRECT_PUBLISH enabled, the message is
+    PUBLISHed directly using the same channel name and msgpack encoding channels_redis uses,
+    so no event loop has to be spun up for the call.
+
+    Other Redis-backed layers get the send scheduled on a shared background event loop and
+    return without waiting for it; failures are logged. The in-memory layer only works on the
+    server's own loop, so it still goes through async_to_sync.
+    """
+    if _direct_publish_enabled():
+        prefix = settings.CHANNEL_LAYERS["default"].get("CONFIG", {}).get("prefix", "asgi")
+        _redis_client().publish(f"{prefix}__group__{group_name}", msgpack.packb(message))
+        return
+
+    channel_layer = get_channel_layer()
+    if not channel_layer:
+        return
+
+    if settings.CHANNEL_LAYERS["default"]["BACKEND"] == IN_MEMORY_LAYER:
+        async_to_sync(channel_layer.group_send)(group_name, message)
+        return
+
+    future = asyncio.run_coroutine_threadsafe(channel_layer.group_send(group_name, message), _notification_loop())
+    future.add_done_callback(_log_send_failure)
@@ -0,0 +1,56 @@
+from django.core.cache import cache
+
+# A device counts as alive if it was seen within this many seconds
+ALIVE_THRESHOLD_SECONDS = 60  # TODO Adjust the threshold as needed
+
+# Session status is polled by clients, so keep it just long enough to absorb bursts of polls
+SESSION_STATUS_CACHE_TIMEOUT = 1
+
+
+def _presence_cache_key(device_id):
+    return f"last_seen:{device_id}"
+
+
+def remember_last_seen(device):
+    """
+    Cache the (owner id, last seen timestamp) pair for a device so liveness checks can skip the database.
+    Returns the cached pair.
+    """
+    last_seen_ts = device.last_seen.timestamp() if device.last_seen else None
+    presence = (device.user_id, last_seen_ts)
+    cache.set(_presence_cache_key(device.id), presence, ALIVE_THRESHOLD_SECONDS)
+    return presence
+
+
+def get_cached_presence(device_id):
+    """Return the cached (owner id, last seen timestamp) pair for a device, or None on a cache miss"""
+    return cache.get(_presence_cache_key(device_id))
+
+
+def forget_presence(device_id):
+    """Drop the cached presence, e.g. when the device changes owner"""
+    cache.delete(_presence_cache_key(device_id))
+
+
+def _session_status_cache_key(device_id):
+    return f"session_status:{device_id}"
+
+
+def remember_session_status(device, session):
+    """
+    Cache the (owner id, has active session, is idle) triple for a device, given its open session or None.
+    Returns the cached triple.
+    """
+    status = (device.user_id, session is not None, session.is_idle if session is not None else False)
+    cache.set(_session_status_cache_key(device.id), status, SESSION_STATUS_CACHE_TIMEOUT)
+    return status
+
+
+def get_cached_session_status(device_id):
+    """Return the cached (owner id, has active session, is idle) triple for a device, or None on a cache miss"""
+    return cache.get(_session_status_cache_key(device_id))
+
+
+def forget_session_status(device_id):
+    """Drop the cached session status, e.g. when a session starts, stops or goes idle"""
+    cache.delete(_session_status_cache_key(device_id))
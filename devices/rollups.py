@@ -0,0 +1,54 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timezone as dt_timezone
+
+from django.db.models import F
+
+from devices.models import HourlySessionRollup
+
+# Set while a device's history is deleted together with its rollups, so per-row receivers skip the rollup upkeep
+_deleting_device_history = ContextVar("deleting_device_history", default=False)
+
+
+def rollup_hour(moment):
+    """Return the start of the UTC hour a moment falls in"""
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def add_session_to_rollup(device_id, start_time, end_time):
+    """
+    Count a completed session towards the hourly rollup of its start hour.
+
+    The whole duration goes to the start hour, the same way the statistics attribute sessions to the
+    day and hour they started in.
+    """
+    hour_start = rollup_hour(start_time)
+    HourlySessionRollup.objects.get_or_create(device_id=device_id, hour_start=hour_start)
+    _shift_rollup(device_id, hour_start, 1, (end_time - start_time).total_seconds())
+
+
+def remove_session_from_rollup(device_id, start_time, end_time):
+    """Take a deleted session back out of its hourly rollup"""
+    _shift_rollup(device_id, rollup_hour(start_time), -1, -(end_time - start_time).total_seconds())
+
+
+def _shift_rollup(device_id, hour_start, sessions, seconds):
+    # Increment in SQL so concurrent session closes don't lose updates
+    HourlySessionRollup.objects.filter(device_id=device_id, hour_start=hour_start).update(
+        sessions=F("sessions") + sessions, seconds=F("seconds") + seconds
+    )
+
+
+@contextmanager
+def deleting_device_history():
+    """Mark the deletes in the block as wiping a device's history, rollups included, e.g. on release"""
+    token = _deleting_device_history.set(True)
+    try:
+        yield
+    finally:
+        _deleting_device_history.reset(token)
+
+
+def is_deleting_device_history():
+    """Whether the current delete is part of a deleting_device_history() block"""
+    return _deleting_device_history.get()
@@ -10,6 +10,9 @@ class DeviceSerializer(serializers.ModelSerializer):
         help_text="Indicates whether the device has an active session"
     )
     is_idle = serializers.SerializerMethodField(help_text="Indicates whether the device is idle (not in use)")
+    is_alive = serializers.BooleanField(
+        read_only=True, help_text="Indicates whether the device sent a heartbeat within the last minute"
+    )
 
     name = serializers.CharField(max_length=100, required=False, default="My Device")
     sensitivity = serializers.IntegerField(
@@ -37,6 +40,7 @@ class DeviceSerializer(serializers.ModelSerializer):
             "api_key",
             "has_active_session",
             "is_idle",
+            "is_alive",
             "last_seen",
         ]
         read_only_fields = [
@@ -49,6 +53,7 @@ class DeviceSerializer(serializers.ModelSerializer):
             "api_key",
             "last_seen",
             "is_idle",
+            "is_alive",
         ]
 
         swagger_schema_fields = {
@@ -58,6 +63,7 @@ class DeviceSerializer(serializers.ModelSerializer):
                 "vibration_intensity": 50,
                 "audio_intensity": 50,
                 "has_active_session": False,
+                "is_alive": True,
                 "last_seen": "2023-10-01T12:00:00Z",
             }
         }
@@ -66,12 +72,17 @@ class DeviceSerializer(serializers.ModelSerializer):
         """
         Check if the device has an active session
         """
-        return obj.sessions.filter(end_time__isnull=True).exists()
+        return obj.in_session
 
     def get_is_idle(self, obj):
         """
         Check if the device is idle
         """
+        if not obj.in_session:
+            return False
+        active_sessions = getattr(obj, "active_sessions", None)
+        if active_sessions is not None:
+            return any(session.is_idle for session in active_sessions)
         return obj.sessions.filter(end_time__isnull=True, is_idle=True).exists()
 
     def to_representation(self, instance):
@@ -100,6 +111,15 @@ class DeviceSerializer(serializers.ModelSerializer):
         return value
 
 
+class UnclaimedDeviceSerializer(serializers.ModelSerializer):
+    """Slim serializer for unclaimed devices, which have no owner or sessions to report"""
+
+    class Meta:
+        model = Device
+        fields = ["id", "name", "registration_date"]
+        read_only_fields = fields
+
+
 class DeviceClaimSerializer(serializers.Serializer):
     name = serializers.CharField(max_length=100, required=True, help_text="Name to assign to the device")
 
@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from custom_permissions.custom_permissions import forget_device_owner
+from devices.models import Device, Session
+from devices.presence import forget_session_status
+from devices.rollups import is_deleting_device_history, remove_session_from_rollup
+from posture.authentication import forget_device_auth
+
+
+@receiver([post_save, post_delete], sender=Session)
+def reset_session_status(sender, instance, **kwargs):
+    """Drop the cached session status whenever one of the device's sessions changes"""
+    forget_session_status(instance.device_id)
+
+
+@receiver(post_delete, sender=Session)
+def remove_from_rollup(sender, instance, **kwargs):
+    """Keep the hourly rollups in step when a completed session is deleted (unless they are being deleted too)"""
+    if instance.end_time is not None and not is_deleting_device_history():
+        remove_session_from_rollup(instance.device_id, instance.start_time, instance.end_time)
+
+
+@receiver(post_delete, sender=Session)
+def end_deleted_session(sender, instance, **kwargs):
+    """Take the device out of session when its open session is deleted, so it can't keep posting readings"""
+    if instance.end_time is None:
+        Device.objects.filter(pk=instance.device_id).update(in_session=False)
+        # The update skips Device's post_save, so the cached credentials (with in_session) are dropped here
+        forget_device_auth(instance.device_id)
+
+
+@receiver([post_save, post_delete], sender=Device)
+def reset_device_auth(sender, instance, update_fields=None, **kwargs):
+    """Drop the cached device credentials and owner when the row changes; heartbeat-only saves don't affect them"""
+    if update_fields is not None and set(update_fields) == {"last_seen"}:
+        return
+    forget_device_auth(instance.pk)
+    forget_device_owner(instance.pk)
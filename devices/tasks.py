@@ -0,0 +1,259 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import groupby, pairwise
+from operator import itemgetter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from devices.models import Session
+from posture.models import PostureComponent, PostureReading
+from ranks.models import UserRank
+from ranks.tiers import get_none_tier, get_tier_for_score
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# Rows fetched per round trip when streaming a session's readings
+READING_CHUNK_SIZE = 2000
+
+# Rank category each posture component type scores towards
+_CATEGORY_MAP = {"neck": "NECK", "shoulders": "SHOULDERS", "torso": "TORSO"}
+
+
+@dataclass(slots=True)
+class CategoryStats:
+    """Per-category aggregates of a session's readings"""
+
+    total_score: int = 0
+    count: int = 0
+    best_streak: int = 0
+    good_posture_time: float = 0  # in seconds
+    bad_posture_time: float = 0  # in seconds
+
+
+_executor = ThreadPoolExecutor(max_workers=settings.SESSION_FINALIZE_WORKERS, thread_name_prefix="finalize-session")
+
+
+def enqueue_finalize_session(session_id, user_id):
+    """
+    Run finalize_session() for a stopped session.
+
+    With SESSION_FINALIZE_IN_BACKGROUND enabled it is handed to a worker thread once the current
+    transaction commits, so the request that stopped the session doesn't wait for the rank update;
+    otherwise it runs inline.
+    """
+    if settings.SESSION_FINALIZE_IN_BACKGROUND:
+        transaction.on_commit(lambda: _executor.submit(_finalize_session_in_background, session_id, user_id))
+    else:
+        finalize_session(session_id, user_id)
+
+
+def _finalize_session_in_background(session_id, user_id):
+    close_old_connections()
+    try:
+        finalize_session(session_id, user_id)
+    except Exception:
+        logger.exception(f"Failed to finalize session {session_id}")
+    finally:
+        close_old_connections()
+
+
+def finalize_session(session_id, user_id):
+    """Calculate a stopped session's metrics and update the user's ranks"""
+    session = Session.objects.select_related("device").get(pk=session_id)
+    user = User.objects.get(pk=user_id)
+
+    # Calculate session metrics and update ranks
+    process_session_data(user, session.device, session)
+
+    # Initialize user ranks if they don't exist
+    initialize_user_ranks(user)
+
+
+def process_session_data(user, device, session):
+    """Process all session data and calculate rank points"""
+    # Get all readings created during this session
+    readings = PostureReading.objects.filter(
+        device=device, timestamp__gte=session.start_time, timestamp__lte=session.end_time
+    ).order_by()
+
+    # Calculate session duration in minutes
+    session_duration = (session.end_time - session.start_time).total_seconds() / 60
+
+    # Sum and count scores in the database; only streaks and timings need the rows in order
+    overall_totals = readings.aggregate(total_score=Sum("overall_score"), count=Count("id"))
+    if not overall_totals["count"]:
+        return
+
+    component_totals = (
+        PostureComponent.objects.filter(reading__in=readings)
+        .values("component_type")
+        .annotate(total_score=Sum("score"), count=Count("id"))
+    )
+
+    # Initialize category data
+    categories = ["OVERALL", "NECK", "SHOULDERS", "TORSO"]
+    category_data = {category: CategoryStats() for category in categories}
+    # Per category, the reading timestamps and scores in order
+    series = {category: ([], []) for category in categories}
+    category_data["OVERALL"].total_score = overall_totals["total_score"]
+    category_data["OVERALL"].count = overall_totals["count"]
+    for totals in component_totals:
+        category = _CATEGORY_MAP.get(totals["component_type"])
+        if category:
+            category_data[category].total_score = totals["total_score"]
+            category_data[category].count = totals["count"]
+
+    GOOD_POSTURE_THRESHOLD = device.sensitivity
+
+    # Streaks and time tracking: stream plain tuples for the readings and their components in the same
+    # order, and pair each reading with its group of components as both streams advance
+    reading_rows = (
+        readings.order_by("timestamp", "id")
+        .values_list("id", "timestamp", "overall_score")
+        .iterator(chunk_size=READING_CHUNK_SIZE)
+    )
+    component_rows = (
+        PostureComponent.objects.filter(reading__in=readings)
+        .order_by("reading__timestamp", "reading_id")
+        .values_list("reading_id", "component_type", "score")
+        .iterator(chunk_size=READING_CHUNK_SIZE)
+    )
+    component_groups = groupby(component_rows, key=itemgetter(0))
+    next_group = next(component_groups, None)
+
+    overall_timestamps, overall_scores = series["OVERALL"]
+    for reading_id, timestamp, overall_score in reading_rows:
+        overall_timestamps.append(timestamp)
+        overall_scores.append(overall_score)
+
+        if next_group is None or next_group[0] != reading_id:
+            continue
+
+        for _, component_type, score in next_group[1]:
+            category = _CATEGORY_MAP.get(component_type)
+            if category:
+                timestamps, scores = series[category]
+                timestamps.append(timestamp)
+                scores.append(score)
+        next_group = next(component_groups, None)
+
+    for category, (timestamps, scores) in series.items():
+        track_metrics(category_data[category], timestamps, scores, GOOD_POSTURE_THRESHOLD)
+
+    # Calculate and award points for each category
+    points_by_category = {}
+    for category, data in category_data.items():
+        if data.count == 0:
+            continue
+
+        # Base points from average score (0-100 scale)
+        avg_score = data.total_score / data.count
+
+        # Points calculation
+        # 1. Base points from average score
+        base_points = int(avg_score / 2)  # Maximum 50 points from average score
+
+        # 2. Bonus points for session duration (up to 20 points)
+        # Longer sessions give more points, capped at 30 minutes
+        duration_bonus = min(int(session_duration / 1.5), 20)
+
+        # 3. Bonus for streak (up to 15 points)
+        streak_bonus = min(data.best_streak // 5, 15)
+
+        # 4. Bonus for good posture percentage (up to 15 points)
+        total_time = data.good_posture_time + data.bad_posture_time
+        if total_time > 0:
+            good_percentage = data.good_posture_time / total_time
+            posture_bonus = int(good_percentage * 15)
+        else:
+            posture_bonus = 0
+
+        # Total points for this category
+        total_points = base_points + duration_bonus + streak_bonus + posture_bonus
+
+        points_by_category[category] = total_points
+
+    # Update user ranks with the calculated points
+    update_user_ranks(user, points_by_category)
+
+
+def track_metrics(stats, timestamps, scores, threshold):
+    """Record the best good-posture streak and the good/bad posture time of one category's readings on its stats"""
+    best_streak = 0
+    streak = 0
+    for score in scores:
+        if score >= threshold:
+            streak += 1
+            if streak > best_streak:
+                best_streak = streak
+        else:
+            streak = 0
+
+    # Each gap between two readings counts towards the posture held at the earlier one
+    good_posture_time = 0  # in seconds
+    bad_posture_time = 0  # in seconds
+    for (previous, current), score in zip(pairwise(timestamps), scores):
+        time_diff = (current - previous).total_seconds()
+        if score >= threshold:
+            good_posture_time += time_diff
+        else:
+            bad_posture_time += time_diff
+
+    stats.best_streak = best_streak
+    stats.good_posture_time = good_posture_time
+    stats.bad_posture_time = bad_posture_time
+
+
+def update_user_ranks(user, points_by_category):
+    """Update user's ranks for every scored category with one read and one bulk write"""
+    existing_ranks = {rank.category: rank for rank in UserRank.objects.filter(user=user).select_related("tier")}
+    none_tier = get_none_tier()
+    updated_at = timezone.now()
+
+    new_ranks = []
+    changed_ranks = []
+    for category, points in points_by_category.items():
+        user_rank = existing_ranks.get(category)
+        if user_rank is None:
+            user_rank = UserRank(user=user, category=category, tier=none_tier, current_score=0)
+            new_ranks.append(user_rank)
+        else:
+            changed_ranks.append(user_rank)
+
+        # Add new points to existing score
+        user_rank.current_score += points
+        # bulk_update() skips auto_now, so stamp the row ourselves
+        user_rank.last_updated = updated_at
+
+        # Find appropriate tier based on total score
+        tier = get_tier_for_score(user_rank.current_score)
+        if tier:
+            user_rank.tier = tier
+
+    if new_ranks:
+        UserRank.objects.bulk_create(new_ranks, ignore_conflicts=True)
+    if changed_ranks:
+        UserRank.objects.bulk_update(changed_ranks, ["current_score", "tier", "last_updated"])
+
+
+def initialize_user_ranks(user):
+    """Ensure user has rank entries for all categories"""
+    # Check if user already has any ranks
+    has_ranks = UserRank.objects.filter(user=user).exists()
+
+    if not has_ranks:
+        # Get the lowest tier (NONE)
+        none_tier = get_none_tier()
+        if none_tier:
+            # Create initial ranks for all categories
+            for category_code, _ in UserRank.CATEGORY_CHOICES:
+                UserRank.objects.get_or_create(
+                    user=user, category=category_code, defaults={"tier": none_tier, "current_score": 0}
+                )
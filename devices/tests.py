@@ -1 +1,38 @@
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from devices.models import Device, Session
+
+
+class SessionDeletionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.device = Device.objects.create(is_active=True, in_session=True)
+        self.session = Session.objects.create(device=self.device)
+        self.client = APIClient()
+        self.client.credentials(HTTP_X_DEVICE_ID=str(self.device.id), HTTP_X_API_KEY=self.device.api_key)
+
+    def post_reading(self):
+        components = [
+            {"component_type": component_type, "score": 50} for component_type in ("neck", "torso", "shoulders")
+        ]
+        return self.client.post("/posture-data/", {"components": components}, format="json")
+
+    def test_deleting_the_open_session_ends_it_on_the_device(self):
+        # Authenticating caches the device while it is in session
+        self.assertEqual(self.post_reading().status_code, 201)
+
+        self.session.delete()
+
+        self.assertFalse(Device.objects.get(pk=self.device.pk).in_session)
+        self.assertEqual(self.post_reading().status_code, 403)
+
+    def test_deleting_a_completed_session_leaves_the_device_in_session(self):
+        Session.objects.filter(pk=self.session.pk).update(end_time=timezone.now())
+        Session.objects.create(device=self.device)
+
+        Session.objects.get(pk=self.session.pk).delete()
+
+        self.assertTrue(Device.objects.get(pk=self.device.pk).in_session)
@@ -1,34 +1,57 @@
 import io
-
-# Generate QR code for the device
-import os
 import time
+import uuid
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from django.http import FileResponse
+import orjson
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import FileResponse, HttpResponse
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter, OpenApiResponse, extend_schema, extend_schema_view
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
-from custom_permissions.custom_permissions import IsAdminOrReadOnly
+from custom_permissions.custom_permissions import IsAdminOrReadOnly, forget_device_owner
 from devices.models import Device, Session
-from devices.serializers.device_serializers import DeviceClaimSerializer, DeviceSerializer, DeviceSettingsSerializer
-from posture.authentication import DeviceAPIKeyAuthentication
-from utils.qrcode_generator import generate_qrcode
+from devices.notifications import group_send
+from devices.presence import forget_presence, forget_session_status, remember_last_seen
+from devices.rollups import deleting_device_history
+from devices.serializers.device_serializers import (
+    DeviceClaimSerializer,
+    DeviceSerializer,
+    DeviceSettingsSerializer,
+    UnclaimedDeviceSerializer,
+)
+from posture.authentication import DeviceAPIKeyAuthentication, forget_device_auth
+from posture.chart_cache import forget_charts
+from utils.qrcode_generator import make_qrcode_png
+from utils.renderers import ORJSONRenderer
 
 # Long polling timeout in seconds - kept for REST API fallback
 LONG_POLL_TIMEOUT = 30
 POLL_INTERVAL = 0.5  # Half a second between checks
 
+# The first page of unclaimed devices is what the admin UI loads, so it is cached until devices change hands
+UNCLAIMED_FIRST_PAGE_CACHE_KEY = "unclaimed:page1"
+UNCLAIMED_FIRST_PAGE_CACHE_TIMEOUT = 300
+
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class UnclaimedDevicePagination(PageNumberPagination):
+    page_size = 100
+
+
+def invalidate_unclaimed_devices_cache():
+    cache.delete(UNCLAIMED_FIRST_PAGE_CACHE_KEY)
+
+
 @extend_schema_view(
     list=extend_schema(
         tags=["devices-user"],
@@ -125,8 +148,8 @@ logger = logging.getLogger(__name__)
     ),
     unclaimed_devices=extend_schema(
         tags=["devices-admin"],
-        description="List all unclaimed devices (admin only)",
-        responses={200: DeviceSerializer(many=True)},
+        description="List all unclaimed devices (admin only), paginated by 100",
+        responses={200: UnclaimedDeviceSerializer(many=True)},
     ),
     device_settings=extend_schema(
         tags=["devices-api"],
@@ -205,11 +228,15 @@ class DeviceViewSet(viewsets.ModelViewSet):
         if self.action == "destroy":
             return Device.objects.filter(user__isnull=True, is_active=False)
         user = self.request.user
-        return Device.objects.filter(user=user)
+        # Answer has_active_session/is_idle from one prefetch instead of two queries per device
+        return Device.objects.filter(user=user).prefetch_related(
+            Prefetch("sessions", queryset=Session.objects.filter(end_time__isnull=True), to_attr="active_sessions")
+        )
 
     def perform_create(self, serializer):
         # Create device with defaults if not specified
         serializer.save()
+        invalidate_unclaimed_devices_cache()
 
     def create(self, request, *args, **kwargs):
         # Handle empty request body by providing defaults
@@ -222,24 +249,14 @@ class DeviceViewSet(viewsets.ModelViewSet):
         # Create QR content with device info and claim endpoint
         qr_content = f"{device_id}"
 
-        # Generate a temporary QR code file
-        temp_filename = f"device_{device_id}_qrcode.png"
-        qr_path = generate_qrcode(qr_content, temp_filename)
-
-        # Open the image and prepare for direct download
-        with open(qr_path, "rb") as qr_file:
-            image_data = qr_file.read()
-
-        # Remove the temporary file
-        os.remove(qr_path)
-
-        # Create a file-like object from the image data
-        image_io = io.BytesIO(image_data)
+        # Generate the QR code in memory; the file name is only used for the download
+        qr_filename = f"device_{device_id}_qrcode.png"
+        image_io = io.BytesIO(make_qrcode_png(qr_content))
 
         # Return as FileResponse for proper binary handling
         response = FileResponse(image_io, content_type="image/png")
         # Ensure proper header formatting for downloading
-        response["Content-Disposition"] = f'attachment; filename="{temp_filename}"'
+        response["Content-Disposition"] = f'attachment; filename="{qr_filename}"'
         # Add Access-Control-Expose-Headers to make Content-Disposition accessible to JS
         response["Access-Control-Expose-Headers"] = "Content-Disposition"
         return response
@@ -284,37 +301,34 @@ class DeviceViewSet(viewsets.ModelViewSet):
         """
         Notify WebSocket clients about device setting changes
         """
-        channel_layer = get_channel_layer()
-
-        # Add debugging
-        if channel_layer:
-            # Make sure we're using the device ID in the correct format - with hyphens
-            device_id = str(device.id)  # This will include hyphens
-            group_name = f"device_settings_{device_id}"
-
-            try:
-                # Include more data in the event for debugging
-                async_to_sync(channel_layer.group_send)(
-                    group_name,
-                    {
-                        "type": "device_settings_update",
-                        "device_id": device_id,
-                        "timestamp": str(now()),
-                        "settings": {
-                            "sensitivity": device.sensitivity,
-                            "vibration_intensity": device.vibration_intensity,
-                            "audio_intensity": device.audio_intensity,
-                        },
+        # Make sure we're using the device ID in the correct format - with hyphens
+        device_id = str(device.id)  # This will include hyphens
+        group_name = f"device_settings_{device_id}"
+
+        try:
+            # Include more data in the event for debugging
+            group_send(
+                group_name,
+                {
+                    "type": "device_settings_update",
+                    "device_id": device_id,
+                    "timestamp": str(now()),
+                    "settings": {
+                        "sensitivity": device.sensitivity,
+                        "vibration_intensity": device.vibration_intensity,
+                        "audio_intensity": device.audio_intensity,
                     },
-                )
-            except Exception as e:
-                logger.error(f"Failed to send WebSocket notification: {str(e)}")
-                logger.exception("WebSocket notification error details:")
+                },
+            )
+        except Exception as e:
+            logger.error(f"Failed to send WebSocket notification: {str(e)}")
+            logger.exception("WebSocket notification error details:")
 
     def perform_destroy(self, instance):
         # Only allow deletion if the user is an admin and the device is unclaimed
         if self.request.user.is_staff and instance.user is None:
             instance.delete()
+            invalidate_unclaimed_devices_cache()
             return None
         else:
             return Response(
@@ -323,21 +337,31 @@ class DeviceViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=["post"], url_path="claim", permission_classes=[permissions.IsAuthenticated])
     def claim_device(self, request, pk=None):
-        try:
-            device = Device.objects.get(id=pk, user__isnull=True, is_active=False)
-        except Device.DoesNotExist:
-            return Response({"error": _("Device not found or already claimed.")}, status=status.HTTP_404_NOT_FOUND)
-
         serializer = DeviceClaimSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         name = serializer.validated_data["name"]
 
-        device.user = request.user
-        device.name = name
-        device.is_active = True
-        device.save()
+        # Cache keys are built from the canonical UUID, whatever form the URL used
+        try:
+            device_id = uuid.UUID(str(pk))
+        except ValueError:
+            return Response({"error": _("Device not found or already claimed.")}, status=status.HTTP_404_NOT_FOUND)
+
+        # Claim with a single conditional UPDATE so two concurrent claims cannot both succeed
+        claimed = Device.objects.filter(id=device_id, user__isnull=True, is_active=False).update(
+            user=request.user, name=name, is_active=True
+        )
+        if not claimed:
+            return Response({"error": _("Device not found or already claimed.")}, status=status.HTTP_404_NOT_FOUND)
+        forget_presence(device_id)
+        forget_session_status(device_id)
+        forget_device_auth(device_id)
+        forget_device_owner(device_id)
+        invalidate_unclaimed_devices_cache()
+
+        device = self.get_queryset().get(pk=device_id)
 
         # Notify WebSocket clients about settings change
         self.notify_settings_change(device)
@@ -351,16 +375,26 @@ class DeviceViewSet(viewsets.ModelViewSet):
         except Device.DoesNotExist:
             return Response({"error": _("Device not found or not owned by you.")}, status=status.HTTP_404_NOT_FOUND)
 
-        device.posture_readings.all().delete()
-        device.sessions.all().delete()
-
-        device.user = None
-        device.name = "My Device"
-        device.sensitivity = 50
-        device.vibration_intensity = 50
-        device.audio_intensity = 50
-        device.is_active = False
-        device.save()
+        # The rollups are deleted along with the history they sum, so the per-row receivers are told not to
+        # take each deleted session back out of its rollup
+        with transaction.atomic(), deleting_device_history():
+            device.session_rollups.all().delete()
+            device.sessions.all().delete()
+            device.posture_rollups.all().delete()
+            device.posture_readings.all().delete()
+            device.in_session = False
+
+            device.user = None
+            device.name = "My Device"
+            device.sensitivity = 50
+            device.vibration_intensity = 50
+            device.audio_intensity = 50
+            device.is_active = False
+            device.save()
+        forget_presence(device.id)
+        forget_session_status(device.id)
+        forget_charts(device.id)
+        invalidate_unclaimed_devices_cache()
 
         # Notify WebSocket clients about settings change
         self.notify_settings_change(device)
@@ -369,9 +403,24 @@ class DeviceViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=["get"], url_path="unclaimed", permission_classes=[permissions.IsAdminUser])
     def unclaimed_devices(self, request):
-        devices = Device.objects.filter(user__isnull=True, is_active=False)
-        serializer = self.get_serializer(devices, many=True)
-        return Response(serializer.data)
+        paginator = UnclaimedDevicePagination()
+        is_first_page = request.query_params.get(paginator.page_query_param, "1") == "1"
+        if is_first_page:
+            cached = cache.get(UNCLAIMED_FIRST_PAGE_CACHE_KEY)
+            if cached is not None:
+                return Response(cached)
+
+        devices = (
+            Device.objects.filter(user__isnull=True, is_active=False)
+            .only("id", "name", "registration_date")
+            .order_by("-registration_date")
+        )
+        page = paginator.paginate_queryset(devices, request, view=self)
+        response = paginator.get_paginated_response(UnclaimedDeviceSerializer(page, many=True).data)
+
+        if is_first_page:
+            cache.set(UNCLAIMED_FIRST_PAGE_CACHE_KEY, response.data, UNCLAIMED_FIRST_PAGE_CACHE_TIMEOUT)
+        return response
 
     @action(
         detail=False,
@@ -379,6 +428,7 @@ class DeviceViewSet(viewsets.ModelViewSet):
         url_path="settings",
         authentication_classes=[DeviceAPIKeyAuthentication],
         permission_classes=[permissions.AllowAny],
+        renderer_classes=[ORJSONRenderer],
     )
     def device_settings(self, request):
         """
@@ -411,16 +461,17 @@ class DeviceViewSet(viewsets.ModelViewSet):
         # Update last_seen timestamp
         device.last_seen = now()
         device.save(update_fields=["last_seen"])
+        remember_last_seen(device)
 
         # If no long polling parameters are provided, return current settings immediately
         if last_sensitivity is None and last_vibration_intensity is None and last_session_status is None:
-            has_active_session = Session.objects.filter(device=device, end_time__isnull=True).exists()
             data = {
                 "sensitivity": device.sensitivity,
                 "vibration_intensity": device.vibration_intensity,
-                "has_active_session": has_active_session,
+                "has_active_session": device.in_session,
             }
-            return Response(data, status=status.HTTP_200_OK)
+            # Fixed-shape payload: skip content negotiation and the renderer entirely
+            return HttpResponse(orjson.dumps(data), content_type="application/json")
 
         # Keep checking for changes until timeout
         start_time = time.time()
@@ -429,7 +480,7 @@ class DeviceViewSet(viewsets.ModelViewSet):
             device.refresh_from_db()
 
             # Check if there's an active session for this device
-            has_active_session = Session.objects.filter(device=device, end_time__isnull=True).exists()
+            has_active_session = device.in_session
 
             # Check if any settings have changed
             settings_changed = (
@@ -445,7 +496,7 @@ class DeviceViewSet(viewsets.ModelViewSet):
                     "vibration_intensity": device.vibration_intensity,
                     "has_active_session": has_active_session,
                 }
-                return Response(data, status=status.HTTP_200_OK)
+                return HttpResponse(orjson.dumps(data), content_type="application/json")
 
             # Wait before checking again to reduce database load
             time.sleep(POLL_INTERVAL)
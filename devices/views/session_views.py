@@ -1,22 +1,34 @@
 # views.py
 
 import logging
+import time
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+import orjson
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
 from django.utils import timezone
 from django.utils.timezone import now
 from drf_spectacular.utils import OpenApiExample, extend_schema, extend_schema_view
 from rest_framework import status
-from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from custom_permissions.custom_permissions import IsDeviceOwner
+from custom_permissions.custom_permissions import IsDeviceOwner, get_owned_device
 from devices.models import Device, Session
-from posture.models import PostureReading
-from ranks.models import RankTier, UserRank
+from devices.notifications import group_send
+from devices.presence import (
+    ALIVE_THRESHOLD_SECONDS,
+    forget_session_status,
+    get_cached_presence,
+    get_cached_session_status,
+    remember_last_seen,
+    remember_session_status,
+)
+from devices.rollups import add_session_to_rollup
+from devices.tasks import enqueue_finalize_session
+from posture.authentication import forget_device_auth
+from utils.renderers import ORJSONRenderer
 
 logger = logging.getLogger(__name__)
 
@@ -25,9 +37,36 @@ def check_device_alive(device):
     """
     Check if the device is alive based on its last seen timestamp.
     """
-    if not device.last_seen:
-        return False
-    return (timezone.now() - device.last_seen).total_seconds() < 60  # TODO Adjust the threshold as needed
+    return device.is_alive
+
+
+def notify_session_change(device, has_active_session, is_idle):
+    """
+    Notify WebSocket clients about a device's session starting or stopping
+    """
+    # Make sure we're using the device ID in the correct format - with hyphens
+    device_id = str(device.id)  # This will include hyphens
+    group_name = f"device_settings_{device_id}"
+
+    try:
+        group_send(
+            group_name,
+            {
+                "type": "device_settings_update",
+                "device_id": device_id,
+                "timestamp": str(now()),
+                "settings": {
+                    "sensitivity": device.sensitivity,
+                    "vibration_intensity": device.vibration_intensity,
+                    "audio_intensity": device.audio_intensity,
+                    "has_active_session": has_active_session,
+                    "is_idle": is_idle,
+                },
+            },
+        )
+    except Exception as e:
+        logger.error(f"Failed to send WebSocket notification: {str(e)}")
+        logger.exception("WebSocket notification error details:")
 
 
 @extend_schema_view(
@@ -46,62 +85,34 @@ class SessionStartView(APIView):
     """Start a new session for a device"""
 
     permission_classes = [IsAuthenticated, IsDeviceOwner]
+    renderer_classes = [ORJSONRenderer]
 
     def put(self, request, device_id):
-        device = get_object_or_404(Device, id=device_id)
+        device = get_owned_device(request, device_id)
 
         # Check if the device is alive
         if not check_device_alive(device):
             return Response({"message": "Device is not alive"}, status=status.HTTP_400_BAD_REQUEST)
 
-        active_session = device.sessions.filter(end_time__isnull=True).first()
-        if active_session:
+        if device.in_session:
             return Response({"message": "Session already active"}, status=status.HTTP_200_OK)
 
-        Session.objects.create(device=device)
+        try:
+            with transaction.atomic():
+                Session.objects.create(device=device)
+                Device.objects.filter(pk=device.pk).update(in_session=True)
+        except IntegrityError:
+            # A concurrent start won the race for the device's one open session
+            return Response({"message": "Session already active"}, status=status.HTTP_200_OK)
+        device.in_session = True
+        # update() sends no post_save, so drop the cached device credentials ourselves
+        forget_device_auth(device.id)
 
-        # Notify WebSocket clients about session status change
-        self.notify_settings_change(device)
+        # Notify WebSocket clients about session status change (a new session starts out active)
+        notify_session_change(device, has_active_session=True, is_idle=False)
 
         return Response({"message": "Session started"}, status=status.HTTP_201_CREATED)
 
-    def notify_settings_change(self, device):
-        """
-        Notify WebSocket clients about device setting changes
-        """
-        channel_layer = get_channel_layer()
-
-        # Add debugging
-        if channel_layer:
-            # Make sure we're using the device ID in the correct format - with hyphens
-            device_id = str(device.id)  # This will include hyphens
-            group_name = f"device_settings_{device_id}"
-
-            try:
-                # Include more data in the event for debugging
-
-                # Check if the device is idle
-                is_idle = device.sessions.filter(end_time__isnull=True, is_idle=True).exists()
-
-                async_to_sync(channel_layer.group_send)(
-                    group_name,
-                    {
-                        "type": "device_settings_update",
-                        "device_id": device_id,
-                        "timestamp": str(now()),
-                        "settings": {
-                            "sensitivity": device.sensitivity,
-                            "vibration_intensity": device.vibration_intensity,
-                            "audio_intensity": device.audio_intensity,
-                            "has_active_session": True,
-                            "is_idle": is_idle,
-                        },
-                    },
-                )
-            except Exception as e:
-                logger.error(f"Failed to send WebSocket notification: {str(e)}")
-                logger.exception("WebSocket notification error details:")
-
 
 @extend_schema_view(
     put=extend_schema(
@@ -118,229 +129,44 @@ class SessionStopView(APIView):
     """Stop the active session for a device"""
 
     permission_classes = [IsAuthenticated, IsDeviceOwner]
+    renderer_classes = [ORJSONRenderer]
 
     def put(self, request, device_id):
-        device = get_object_or_404(Device, id=device_id)
+        device = get_owned_device(request, device_id)
 
         # Check if the device is alive
         if not check_device_alive(device):
             return Response({"message": "Device is not alive"}, status=status.HTTP_400_BAD_REQUEST)
 
-        active_session = device.sessions.filter(end_time__isnull=True).first()
+        # The in_session flag answers "no active session" without a query
+        active_session = (
+            device.sessions.filter(end_time__isnull=True).values_list("id", "start_time").first()
+            if device.in_session
+            else None
+        )
         if not active_session:
             return Response({"message": "No active session"}, status=status.HTTP_200_OK)
+        active_session_id, start_time = active_session
 
-        active_session.end_time = timezone.now()
-        active_session.is_idle = False
-        active_session.save()
-
-        user = self.request.user
+        # Close the session with a narrow UPDATE instead of saving every column
+        end_time = timezone.now()
+        with transaction.atomic():
+            Session.objects.filter(id=active_session_id).update(end_time=end_time, is_idle=False)
+            Device.objects.filter(pk=device.pk).update(in_session=False)
+            add_session_to_rollup(device.pk, start_time, end_time)
+        device.in_session = False
+        # update() sends no post_save, so drop the cached status and device credentials ourselves
+        forget_session_status(device.id)
+        forget_device_auth(device.id)
 
-        # Calculate session metrics and update ranks
-        self._process_session_data(user, device, active_session)
+        # Calculate session metrics and update ranks once the session is stored
+        enqueue_finalize_session(active_session_id, self.request.user.id)
 
-        # Initialize user ranks if they don't exist
-        self._initialize_user_ranks(user)
-
-        # Notify WebSocket clients about a session status change
-        self.notify_settings_change(device)
+        # Notify WebSocket clients about a session status change (a stopped session is never idle)
+        notify_session_change(device, has_active_session=False, is_idle=False)
 
         return Response({"message": "Session stopped"}, status=status.HTTP_200_OK)
 
-    def _process_session_data(self, user, device, session):
-        """Process all session data and calculate rank points"""
-        # Get all readings created during this session
-        readings = PostureReading.objects.filter(
-            device=device, timestamp__gte=session.start_time, timestamp__lte=session.end_time
-        )
-
-        if not readings.exists():
-            return
-
-        # Calculate session duration in minutes
-        session_duration = (session.end_time - session.start_time).total_seconds() / 60
-
-        # Initialize category data
-        categories = ["OVERALL", "NECK", "SHOULDERS", "TORSO"]
-        category_data = {
-            category: {
-                "total_score": 0,
-                "count": 0,
-                "streak": 0,
-                "best_streak": 0,
-                "good_posture_time": 0,  # in seconds
-                "bad_posture_time": 0,  # in seconds
-                "prev_timestamp": None,
-                "prev_was_good": False,
-            }
-            for category in categories
-        }
-
-        GOOD_POSTURE_THRESHOLD = device.sensitivity
-
-        # Streaks and time tracking
-        readings_sorted = readings.order_by("timestamp")
-
-        for reading in readings_sorted:
-            # Process overall score
-            category_data["OVERALL"]["total_score"] += reading.overall_score
-            category_data["OVERALL"]["count"] += 1
-
-            # Track streak and time for overall
-            self._track_metrics(
-                category_data["OVERALL"], reading.timestamp, reading.overall_score, GOOD_POSTURE_THRESHOLD
-            )
-
-            # Process component scores
-            components = reading.components.all()
-            for component in components:
-                category = None
-                if component.component_type == "neck":
-                    category = "NECK"
-                elif component.component_type == "shoulders":
-                    category = "SHOULDERS"
-                elif component.component_type == "torso":
-                    category = "TORSO"
-
-                if category:
-                    category_data[category]["total_score"] += component.score
-                    category_data[category]["count"] += 1
-
-                    # Track streak and time for this component
-                    self._track_metrics(
-                        category_data[category], reading.timestamp, component.score, GOOD_POSTURE_THRESHOLD
-                    )
-
-        # Calculate and award points for each category
-        for category, data in category_data.items():
-            if data["count"] == 0:
-                continue
-
-            # Base points from average score (0-100 scale)
-            avg_score = data["total_score"] / data["count"]
-
-            # Points calculation
-            # 1. Base points from average score
-            base_points = int(avg_score / 2)  # Maximum 50 points from average score
-
-            # 2. Bonus points for session duration (up to 20 points)
-            # Longer sessions give more points, capped at 30 minutes
-            duration_bonus = min(int(session_duration / 1.5), 20)
-
-            # 3. Bonus for streak (up to 15 points)
-            streak_bonus = min(data["best_streak"] // 5, 15)
-
-            # 4. Bonus for good posture percentage (up to 15 points)
-            total_time = data["good_posture_time"] + data["bad_posture_time"]
-            if total_time > 0:
-                good_percentage = data["good_posture_time"] / total_time
-                posture_bonus = int(good_percentage * 15)
-            else:
-                posture_bonus = 0
-
-            # Total points for this category
-            total_points = base_points + duration_bonus + streak_bonus + posture_bonus
-
-            # Update user rank with the calculated points
-            self._update_user_rank(user, category, total_points)
-
-    def _track_metrics(self, data, timestamp, score, threshold):
-        """Track streak and time metrics for a reading"""
-        is_good_posture = score >= threshold
-
-        # Update streak
-        if is_good_posture:
-            data["streak"] += 1
-            data["best_streak"] = max(data["best_streak"], data["streak"])
-        else:
-            data["streak"] = 0
-
-        # Update posture time if not the first reading
-        if data["prev_timestamp"] is not None:
-            time_diff = (timestamp - data["prev_timestamp"]).total_seconds()
-
-            if data["prev_was_good"]:
-                data["good_posture_time"] += time_diff
-            else:
-                data["bad_posture_time"] += time_diff
-
-        # Store current state for next reading
-        data["prev_timestamp"] = timestamp
-        data["prev_was_good"] = is_good_posture
-
-    def _update_user_rank(self, user, category, points):
-        """Update user's rank for a specific category based on session performance"""
-        user_rank, created = UserRank.objects.get_or_create(
-            user=user,
-            category=category,
-            defaults={"tier": RankTier.objects.filter(name="NONE").first(), "current_score": 0},
-        )
-
-        # Add new points to existing score
-        user_rank.current_score += points
-
-        # Find appropriate tier based on total score
-        new_tier = (
-            RankTier.objects.filter(minimum_score__lte=user_rank.current_score).order_by("-minimum_score").first()
-        )
-
-        if new_tier:
-            user_rank.tier = new_tier
-
-        user_rank.save()
-
-    def _initialize_user_ranks(self, user):
-        """Ensure user has rank entries for all categories"""
-        # Check if user already has any ranks
-        has_ranks = UserRank.objects.filter(user=user).exists()
-
-        if not has_ranks:
-            # Get the lowest tier (NONE)
-            none_tier = RankTier.objects.filter(name="NONE").first()
-            if none_tier:
-                # Create initial ranks for all categories
-                for category_code, _ in UserRank.CATEGORY_CHOICES:
-                    UserRank.objects.get_or_create(
-                        user=user, category=category_code, defaults={"tier": none_tier, "current_score": 0}
-                    )
-
-    def notify_settings_change(self, device):
-        """
-        Notify WebSocket clients about device setting changes
-        """
-        channel_layer = get_channel_layer()
-
-        # Add debugging
-        if channel_layer:
-            # Make sure we're using the device ID in the correct format - with hyphens
-            device_id = str(device.id)  # This will include hyphens
-            group_name = f"device_settings_{device_id}"
-
-            try:
-
-                # Check if the device is idle
-                is_idle = device.sessions.filter(end_time__isnull=True, is_idle=True).exists()
-
-                # Include more data in the event for debugging
-                async_to_sync(channel_layer.group_send)(
-                    group_name,
-                    {
-                        "type": "device_settings_update",
-                        "device_id": device_id,
-                        "timestamp": str(now()),
-                        "settings": {
-                            "sensitivity": device.sensitivity,
-                            "vibration_intensity": device.vibration_intensity,
-                            "audio_intensity": device.audio_intensity,
-                            "has_active_session": False,
-                            "is_idle": is_idle,
-                        },
-                    },
-                )
-            except Exception as e:
-                logger.error(f"Failed to send WebSocket notification: {str(e)}")
-                logger.exception("WebSocket notification error details:")
-
 
 @extend_schema_view(
     get=extend_schema(
@@ -356,19 +182,32 @@ class SessionStopView(APIView):
 class SessionStatusView(APIView):
     """Check if a device has an active session"""
 
-    permission_classes = [IsAuthenticated, IsDeviceOwner]
+    # Ownership is checked against the cached status entry instead of IsDeviceOwner,
+    # so a cache hit answers the request without touching the database
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
 
     def get(self, request, device_id):
-        device = get_object_or_404(Device, id=device_id)
-
-        # Get the active session (if any)
-        session = device.sessions.filter(end_time__isnull=True).first()
-
-        # A session is active if it was found, since we already filtered for end_time is None
-        has_active_session = session is not None
-        is_idle = session.is_idle if has_active_session else False
-
-        return Response({"has_active_session": has_active_session, "is_idle": is_idle})
+        status_entry = get_cached_session_status(device_id)
+        if status_entry is None:
+            device = Device.objects.only("id", "user_id", "in_session").filter(id=device_id).first()
+            if device is None:
+                self.permission_denied(request)
+
+            # Get the active session (if any)
+            session = None
+            if device.in_session:
+                session = device.sessions.filter(end_time__isnull=True).only("id", "is_idle").first()
+            status_entry = remember_session_status(device, session)
+
+        owner_id, has_active_session, is_idle = status_entry
+        if owner_id != request.user.id:
+            self.permission_denied(request)
+
+        return HttpResponse(
+            orjson.dumps({"has_active_session": has_active_session, "is_idle": is_idle}),
+            content_type="application/json",
+        )
 
 
 @extend_schema_view(
@@ -390,12 +229,24 @@ class IsDeviceAlive(APIView):
     Check if a device is alive based on its last seen timestamp.
     """
 
-    permission_classes = [IsAuthenticated, IsDeviceOwner]
+    # Ownership is checked against the cached presence entry instead of IsDeviceOwner,
+    # so a cache hit answers the request without touching the database
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
 
     def get(self, request, device_id):
-        device = get_object_or_404(Device, id=device_id)
+        presence = get_cached_presence(device_id)
+        if presence is None:
+            device = Device.objects.only("id", "user_id", "last_seen").filter(id=device_id).first()
+            if device is None:
+                self.permission_denied(request)
+            presence = remember_last_seen(device)
+
+        owner_id, last_seen_ts = presence
+        if owner_id != request.user.id:
+            self.permission_denied(request)
 
         # Check if the device is alive
-        is_alive = check_device_alive(device)
+        is_alive = last_seen_ts is not None and time.time() - last_seen_ts < ALIVE_THRESHOLD_SECONDS
 
-        return Response({"is_alive": is_alive})
+        return HttpResponse(orjson.dumps({"is_alive": is_alive}), content_type="application/json")
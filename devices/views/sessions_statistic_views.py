@@ -1,20 +1,31 @@
+import hashlib
+from collections import defaultdict
 from datetime import timedelta
 
+import orjson
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponse
 from django.utils import timezone
+from django.utils.http import parse_etags
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter, extend_schema
+from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from custom_permissions.custom_permissions import IsDeviceOwner
-from devices.models import Device
+from custom_permissions.custom_permissions import IsDeviceOwner, get_owned_device
 from devices.serializers.sessions_statistic_serializers import SessionStatisticsResponseSerializer
+from utils.renderers import ORJSONRenderer
+
+# Statistics are versioned per minute: conditional GETs and the shared cache entry last this long
+STATISTICS_VERSION_SECONDS = 60
 
 
 class SessionStatisticsView(APIView):
     """Calculate and return session usage statistics for a device"""
 
     permission_classes = [IsAuthenticated, IsDeviceOwner]
+    renderer_classes = [ORJSONRenderer]
 
     @extend_schema(
         tags=["device-sessions"],
@@ -31,6 +42,10 @@ class SessionStatisticsView(APIView):
         - Chart data for daily, weekly, and monthly trends
 
         All time durations are returned in seconds for accurate representation.
+
+        Sessions count towards the UTC day and hour they started in. Periods and chart windows are made of
+        whole UTC days: weeks start on Monday at 00:00, and the daily, weekly and monthly charts cover the
+        days from 30, 90 and 365 days ago up to today.
         """,
         parameters=[
             OpenApiParameter(
@@ -43,6 +58,7 @@ class SessionStatisticsView(APIView):
         ],
         responses={
             200: SessionStatisticsResponseSerializer,
+            304: {"description": "Statistics unchanged since the ETag sent in If-None-Match"},
             403: {"description": "Permission denied - not the device owner"},
             404: {"description": "Device not found"},
         },
@@ -82,29 +98,62 @@ class SessionStatisticsView(APIView):
         ],
     )
     def get(self, request, device_id):
-        device = Device.objects.get(id=device_id)
+        device = get_owned_device(request, device_id)
         now = timezone.now()
 
-        # Get all completed sessions
-        completed_sessions = device.sessions.filter(end_time__isnull=False)
-        all_completed_sessions = list(completed_sessions)
+        # Conditional GET: the statistics only change when a session starts, ends or is removed,
+        # or as time passes, so version them on the session table and the current minute
+        etag = self._get_etag(device, now)
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            # Cache the encoded payload so a hit is served without rendering again
+            payload = cache.get_or_set(
+                f"session_stats:{device.id}:{etag}",
+                lambda: orjson.dumps(self._build_statistics(device, now), option=orjson.OPT_UTC_Z),
+                STATISTICS_VERSION_SECONDS,
+            )
+            response = HttpResponse(payload, content_type="application/json")
+
+        response["ETag"] = etag
+        response["Cache-Control"] = f"private, max-age={STATISTICS_VERSION_SECONDS}"
+        return response
 
-        # Collect all data components
-        active_session_data = self._get_active_session_data(device, now)
-        total_seconds = self._get_total_seconds(all_completed_sessions)
-        avg_seconds = self._get_avg_seconds(completed_sessions)
+    def _get_etag(self, device, now):
+        """Build a version tag from one aggregate over the device's sessions and the current minute"""
+        version = device.sessions.aggregate(
+            last_start=Max("start_time"), last_end=Max("end_time"), session_count=Count("id")
+        )
+        time_slot = int(now.timestamp()) // STATISTICS_VERSION_SECONDS
+        token = f"{device.id}|{device.name}|{device.registration_date.isoformat()}|{version}|{time_slot}"
+        return f'"{hashlib.blake2b(token.encode(), digest_size=12).hexdigest()}"'
+
+    def _build_statistics(self, device, now):
+        """Compute the full statistics payload for a device"""
+        # The in_session flag skips the lookup for idle devices; otherwise it is a probe of the unique
+        # index on the device's one open session
+        active_session = None
+        if device.in_session:
+            active_session = device.sessions.filter(end_time__isnull=True).only("start_time").first()
+
+        # Collect all data components from the hourly rollups of the completed sessions
+        active_session_data = self._get_active_session_data(active_session, now)
+        buckets = self._aggregate_sessions(device, now)
+        total_sessions = buckets["total_sessions"]
+        total_seconds = buckets["total_seconds"]
+        avg_seconds = total_seconds / total_sessions if total_sessions else 0
 
         # Calculate time period statistics
-        period_stats = self._calculate_period_stats(all_completed_sessions, now)
+        period_stats = self._calculate_period_stats(buckets["periods"])
 
         # Get chart data
-        chart_data = self._generate_chart_data(all_completed_sessions, now)
+        chart_data = self._generate_chart_data(buckets)
 
         # Get consistency metrics
-        consistency_metrics = self._calculate_consistency_metrics(all_completed_sessions, device, now)
+        consistency_metrics = self._calculate_consistency_metrics(buckets["active_days"], device, now)
 
         # Calculate usage patterns
-        usage_patterns = self._calculate_usage_patterns(all_completed_sessions)
+        usage_patterns = self._calculate_usage_patterns(buckets)
 
         # Build response data
         response_data = {
@@ -113,18 +162,18 @@ class SessionStatisticsView(APIView):
             "active_session": active_session_data,
             "summary": {
                 "average_session_seconds": int(avg_seconds),
-                "total_sessions": completed_sessions.count(),
+                "total_sessions": total_sessions,
                 "total_seconds": int(total_seconds),
                 "consistency_score": consistency_metrics["consistency_score"],
                 "current_streak_days": consistency_metrics["current_streak"],
             },
             "current_period": {
                 "today_seconds": int(period_stats["today_seconds"]),
-                "today_sessions": len(period_stats["today_sessions"]),
+                "today_sessions": period_stats["today_sessions"],
                 "this_week_seconds": int(period_stats["this_week_seconds"]),
-                "this_week_sessions": len(period_stats["this_week_sessions"]),
+                "this_week_sessions": period_stats["this_week_sessions"],
                 "this_month_seconds": int(period_stats["this_month_seconds"]),
-                "this_month_sessions": len(period_stats["this_month_sessions"]),
+                "this_month_sessions": period_stats["this_month_sessions"],
             },
             "comparisons": {
                 "day_change_percent": (
@@ -141,11 +190,10 @@ class SessionStatisticsView(APIView):
             "charts": chart_data,
         }
 
-        return Response(response_data)
+        return response_data
 
-    def _get_active_session_data(self, device, now):
+    def _get_active_session_data(self, active_session, now):
         """Get information about any currently active session"""
-        active_session = device.sessions.filter(end_time__isnull=True).first()
         if not active_session:
             return None
 
@@ -155,60 +203,102 @@ class SessionStatisticsView(APIView):
             "current_duration_seconds": int(current_duration.total_seconds()),
         }
 
-    def _get_total_seconds(self, sessions):
-        """Calculate total seconds from a list of sessions"""
+    def _aggregate_sessions(self, device, now):
+        """
+        Fold the device's hourly session rollups into every period, pattern and chart bucket they fall in.
+
+        The rollups hold one row per hour with sessions, so the work grows with the hours of use rather than
+        the number of sessions. Every window is made of whole UTC days: weeks start on Monday at midnight and
+        the chart windows start at midnight 30, 90 and 365 days ago.
+        """
+        today = now.date()
+        yesterday = today - timedelta(days=1)
+        this_week_start = today - timedelta(days=today.weekday())
+        last_week_start = this_week_start - timedelta(days=7)
+        daily_start = today - timedelta(days=30)
+        weekly_start = today - timedelta(days=90)
+        monthly_start = today - timedelta(days=365)
+        last_month = now.month - 1 if now.month > 1 else 12
+        last_month_year = now.year if now.month > 1 else now.year - 1
+
+        rollups = device.session_rollups.filter(sessions__gt=0).values_list("hour_start", "sessions", "seconds")
+
+        # Each period keeps [session count, total seconds]
+        periods = {
+            period: [0, 0] for period in ("today", "yesterday", "this_week", "last_week", "this_month", "last_month")
+        }
+        weekday_counts = [0] * 7
+        weekday_seconds = [0] * 7
+        hour_counts = [0] * 24
+        hour_seconds = [0] * 24
+        days = defaultdict(lambda: [0, 0])
+        weeks = defaultdict(lambda: [0, 0])
+        months = defaultdict(lambda: [0, 0])
+        active_days = set()
+        total_sessions = 0
         total_seconds = 0
-        for session in sessions:
-            if session.end_time:
-                total_seconds += (session.end_time - session.start_time).total_seconds()
-        return total_seconds
-
-    def _get_avg_seconds(self, queryset):
-        """Calculate average seconds per session"""
-        if not queryset.exists():
-            return 0
-        return self._get_total_seconds(queryset) / queryset.count()
-
-    def _calculate_period_stats(self, all_completed_sessions, now):
-        """Calculate statistics for different time periods"""
-        yesterday = now - timedelta(days=1)
-
-        # Get today's sessions
-        today_sessions = [s for s in all_completed_sessions if s.start_time.date() == now.date()]
-        today_seconds = self._get_total_seconds(today_sessions)
-
-        # Get yesterday's sessions
-        yesterday_sessions = [s for s in all_completed_sessions if s.start_time.date() == yesterday.date()]
-        yesterday_seconds = self._get_total_seconds(yesterday_sessions)
-
-        # Get this week's sessions (from Monday to now)
-        this_week_sessions = [s for s in all_completed_sessions if s.start_time >= now - timedelta(days=now.weekday())]
-        this_week_seconds = self._get_total_seconds(this_week_sessions)
-
-        # Get last week's sessions
-        last_week_sessions = [
-            s
-            for s in all_completed_sessions
-            if s.start_time >= now - timedelta(days=now.weekday() + 7)
-            and s.start_time < now - timedelta(days=now.weekday())
-        ]
-        last_week_seconds = self._get_total_seconds(last_week_sessions)
 
-        # Get this month's sessions
-        this_month_sessions = [
-            s for s in all_completed_sessions if s.start_time.month == now.month and s.start_time.year == now.year
-        ]
-        this_month_seconds = self._get_total_seconds(this_month_sessions)
+        def add(bucket, count, seconds):
+            bucket[0] += count
+            bucket[1] += seconds
+
+        for hour_start, count, seconds in rollups:
+            day = hour_start.date()
+            weekday = day.weekday()
+            total_sessions += count
+            total_seconds += seconds
+            active_days.add(day)
+
+            # Time periods
+            if day == today:
+                add(periods["today"], count, seconds)
+            elif day == yesterday:
+                add(periods["yesterday"], count, seconds)
+            if day >= this_week_start:
+                add(periods["this_week"], count, seconds)
+            elif day >= last_week_start:
+                add(periods["last_week"], count, seconds)
+            if day.month == now.month and day.year == now.year:
+                add(periods["this_month"], count, seconds)
+            elif day.month == last_month and day.year == last_month_year:
+                add(periods["last_month"], count, seconds)
+
+            # Usage patterns
+            weekday_counts[weekday] += count
+            weekday_seconds[weekday] += seconds
+            hour_counts[hour_start.hour] += count
+            hour_seconds[hour_start.hour] += seconds
+
+            # Charts (last 30 days by day, last 90 days by week, last 365 days by month)
+            if day >= daily_start:
+                add(days[day], count, seconds)
+            if day >= weekly_start:
+                add(weeks[day - timedelta(days=weekday)], count, seconds)
+            if day >= monthly_start:
+                add(months[day.strftime("%Y-%m")], count, seconds)
 
-        # Get last month's sessions
-        last_month = now.month - 1 if now.month > 1 else 12
-        last_month_year = now.year if now.month > 1 else now.year - 1
-        last_month_sessions = [
-            s
-            for s in all_completed_sessions
-            if s.start_time.month == last_month and s.start_time.year == last_month_year
-        ]
-        last_month_seconds = self._get_total_seconds(last_month_sessions)
+        return {
+            "total_sessions": total_sessions,
+            "total_seconds": total_seconds,
+            "periods": periods,
+            "weekday_counts": weekday_counts,
+            "weekday_seconds": weekday_seconds,
+            "hour_counts": hour_counts,
+            "hour_seconds": hour_seconds,
+            "days": days,
+            "weeks": weeks,
+            "months": months,
+            "active_days": active_days,
+        }
+
+    def _calculate_period_stats(self, periods):
+        """Calculate statistics for different time periods"""
+        today_sessions, today_seconds = periods["today"]
+        _, yesterday_seconds = periods["yesterday"]
+        this_week_sessions, this_week_seconds = periods["this_week"]
+        _, last_week_seconds = periods["last_week"]
+        this_month_sessions, this_month_seconds = periods["this_month"]
+        _, last_month_seconds = periods["last_month"]
 
         # Calculate period comparisons
         day_change = ((today_seconds - yesterday_seconds) / yesterday_seconds * 100) if yesterday_seconds > 0 else None
@@ -222,148 +312,67 @@ class SessionStatisticsView(APIView):
         return {
             "today_sessions": today_sessions,
             "today_seconds": today_seconds,
-            "yesterday_sessions": yesterday_sessions,
-            "yesterday_seconds": yesterday_seconds,
             "this_week_sessions": this_week_sessions,
             "this_week_seconds": this_week_seconds,
-            "last_week_sessions": last_week_sessions,
-            "last_week_seconds": last_week_seconds,
             "this_month_sessions": this_month_sessions,
             "this_month_seconds": this_month_seconds,
-            "last_month_sessions": last_month_sessions,
-            "last_month_seconds": last_month_seconds,
             "day_change": day_change,
             "week_change": week_change,
             "month_change": month_change,
         }
 
-    def _calculate_usage_patterns(self, all_completed_sessions):
+    def _calculate_usage_patterns(self, buckets):
         """Calculate usage patterns by weekday and hour"""
-        # Calculate weekday patterns
-        weekday_stats = {}
-        for session in all_completed_sessions:
-            weekday = session.start_time.weekday()
-            if weekday not in weekday_stats:
-                weekday_stats[weekday] = {"count": 0, "total_seconds": 0}
-            weekday_stats[weekday]["count"] += 1
-            if session.end_time:
-                weekday_stats[weekday]["total_seconds"] += (session.end_time - session.start_time).total_seconds()
-
-        weekday_patterns = []
         weekday_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        for weekday in range(7):
-            if weekday in weekday_stats:
-                stats = weekday_stats[weekday]
-                weekday_patterns.append(
-                    {
-                        "weekday": weekday_names[weekday],
-                        "count": stats["count"],
-                        "avg_seconds": int(stats["total_seconds"] / stats["count"]) if stats["count"] > 0 else 0,
-                    }
-                )
-
-        # Calculate hourly patterns
-        hourly_stats = {}
-        for session in all_completed_sessions:
-            hour = session.start_time.hour
-            if hour not in hourly_stats:
-                hourly_stats[hour] = {"count": 0, "total_seconds": 0}
-            hourly_stats[hour]["count"] += 1
-            if session.end_time:
-                hourly_stats[hour]["total_seconds"] += (session.end_time - session.start_time).total_seconds()
-
-        hourly_patterns = []
-        for hour in range(24):
-            if hour in hourly_stats:
-                stats = hourly_stats[hour]
-                hourly_patterns.append(
-                    {
-                        "hour": hour,
-                        "count": stats["count"],
-                        "avg_seconds": int(stats["total_seconds"] / stats["count"]) if stats["count"] > 0 else 0,
-                    }
-                )
+        weekday_counts = buckets["weekday_counts"]
+        weekday_seconds = buckets["weekday_seconds"]
+        weekday_patterns = [
+            {
+                "weekday": weekday_names[weekday],
+                "count": weekday_counts[weekday],
+                "avg_seconds": int(weekday_seconds[weekday] / weekday_counts[weekday]),
+            }
+            for weekday in range(7)
+            if weekday_counts[weekday]
+        ]
+
+        hour_counts = buckets["hour_counts"]
+        hour_seconds = buckets["hour_seconds"]
+        hourly_patterns = [
+            {"hour": hour, "count": hour_counts[hour], "avg_seconds": int(hour_seconds[hour] / hour_counts[hour])}
+            for hour in range(24)
+            if hour_counts[hour]
+        ]
 
         return {"by_weekday": weekday_patterns, "by_hour": hourly_patterns}
 
-    def _calculate_consistency_metrics(self, all_completed_sessions, device, now):
+    def _calculate_consistency_metrics(self, active_days, device, now):
         """Calculate consistency score and current streak"""
         # Calculate consistency score (0-100) based on regular usage patterns
         total_days = (now.date() - device.registration_date.date()).days + 1
-        days_with_sessions = len(set(session.start_time.date() for session in all_completed_sessions))
-        consistency_score = round((days_with_sessions / total_days) * 100) if total_days > 0 else 0
+        consistency_score = round((len(active_days) / total_days) * 100) if total_days > 0 else 0
 
-        # Calculate streak (consecutive days with sessions)
-        day_list = sorted(set(session.start_time.date() for session in all_completed_sessions), reverse=True)
+        # Calculate streak (consecutive days with sessions, counting back from today)
         current_streak = 0
-        if day_list:
-            current_date = now.date()
-            for i, day in enumerate(day_list):
-                if day == current_date - timedelta(days=i):
-                    current_streak += 1
-                else:
-                    break
+        current_date = now.date()
+        while current_date - timedelta(days=current_streak) in active_days:
+            current_streak += 1
 
         return {"consistency_score": consistency_score, "current_streak": current_streak}
 
-    def _generate_chart_data(self, all_completed_sessions, now):
+    def _generate_chart_data(self, buckets):
         """Generate time-based chart data"""
-        # Group sessions by day for daily stats (last 30 days)
-        days_dict = {}
-        for session in all_completed_sessions:
-            if session.start_time >= now - timedelta(days=30):
-                day_key = session.start_time.date()
-                if day_key not in days_dict:
-                    days_dict[day_key] = []
-                days_dict[day_key].append(session)
-
-        formatted_daily = []
-        for day, day_sessions in sorted(days_dict.items()):
-            formatted_daily.append(
-                {
-                    "date": day.strftime("%Y-%m-%d"),
-                    "sessions": len(day_sessions),
-                    "seconds": int(self._get_total_seconds(day_sessions)),
-                }
-            )
-
-        # Group sessions by week for weekly stats (last 90 days)
-        weeks_dict = {}
-        for session in all_completed_sessions:
-            if session.start_time >= now - timedelta(days=90):
-                # Calculate week start date (Monday)
-                week_start = session.start_time.date() - timedelta(days=session.start_time.weekday())
-                if week_start not in weeks_dict:
-                    weeks_dict[week_start] = []
-                weeks_dict[week_start].append(session)
-
-        formatted_weekly = []
-        for week_start, week_sessions in sorted(weeks_dict.items()):
-            formatted_weekly.append(
-                {
-                    "week": week_start.strftime("%Y-%m-%d"),
-                    "sessions": len(week_sessions),
-                    "seconds": int(self._get_total_seconds(week_sessions)),
-                }
-            )
-
-        # Group sessions by month for monthly stats (last 365 days)
-        months_dict = {}
-        for session in all_completed_sessions:
-            if session.start_time >= now - timedelta(days=365):
-                month_key = session.start_time.strftime("%Y-%m")
-                if month_key not in months_dict:
-                    months_dict[month_key] = []
-                months_dict[month_key].append(session)
-
-        formatted_monthly = []
-        for month, month_sessions in sorted(months_dict.items()):
-            formatted_monthly.append(
-                {
-                    "month": month,
-                    "sessions": len(month_sessions),
-                    "seconds": int(self._get_total_seconds(month_sessions)),
-                }
-            )
+        formatted_daily = [
+            {"date": day.strftime("%Y-%m-%d"), "sessions": count, "seconds": int(seconds)}
+            for day, (count, seconds) in sorted(buckets["days"].items())
+        ]
+        formatted_weekly = [
+            {"week": week_start.strftime("%Y-%m-%d"), "sessions": count, "seconds": int(seconds)}
+            for week_start, (count, seconds) in sorted(buckets["weeks"].items())
+        ]
+        formatted_monthly = [
+            {"month": month, "sessions": count, "seconds": int(seconds)}
+            for month, (count, seconds) in sorted(buckets["months"].items())
+        ]
 
         return {"daily": formatted_daily, "weekly": formatted_weekly, "monthly": formatted_monthly}
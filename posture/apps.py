@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PostureConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "posture"
+
+    def ready(self):
+        from posture import signals  # noqa: F401
@@ -1,10 +1,33 @@
+import hmac
+import re
 import uuid
 
+from django.core.cache import cache
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
+from devices.models import hash_api_key
+
 from .models import Device
 
+# How long a resolved device stays cached; any change to the device row drops it earlier
+DEVICE_AUTH_CACHE_TIMEOUT = 300
+
+# A UUID in its canonical hyphenated or plain 32-hex-digit form
+_UUID_RE = re.compile(r"\A[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}\Z")
+
+# Cached in place of a device when no active device has the requested ID
+_NO_ACTIVE_DEVICE = "inactive"
+
+
+def _device_auth_cache_key(device_id):
+    return f"device_auth:{device_id}"
+
+
+def forget_device_auth(device_id):
+    """Drop the cached credentials of a device, e.g. after its row was updated"""
+    cache.delete(_device_auth_cache_key(device_id))
+
 
 class DeviceAPIKeyAuthentication(BaseAuthentication):
     def authenticate(self, request):
@@ -14,15 +37,22 @@ class DeviceAPIKeyAuthentication(BaseAuthentication):
         if not device_id or not api_key:
             return None
 
-        # Validate UUID format
-        try:
-            uuid_obj = uuid.UUID(device_id)
-        except ValueError:
+        # Validate UUID format, rejecting malformed IDs before parsing them
+        if not _UUID_RE.match(device_id):
             raise AuthenticationFailed("Invalid device ID format (must be a UUID)")
-
-        try:
-            device = Device.objects.get(id=uuid_obj, api_key=api_key, is_active=True)
-        except Device.DoesNotExist:
+        uuid_obj = uuid.UUID(hex=device_id)
+
+        # Keys are only ever compared as keyed digests, in constant time. Repeat requests are served
+        # from the cache, and a wrong key is rejected without touching the database.
+        cache_key = _device_auth_cache_key(uuid_obj)
+        api_key_hash = hash_api_key(api_key)
+        device = cache.get(cache_key)
+        if device is None:
+            # The plaintext key is left unloaded, so it is never copied into the (possibly shared) cache
+            device = Device.objects.defer("api_key").filter(id=uuid_obj, is_active=True).first() or _NO_ACTIVE_DEVICE
+            cache.set(cache_key, device, DEVICE_AUTH_CACHE_TIMEOUT)
+
+        if device == _NO_ACTIVE_DEVICE or not hmac.compare_digest(device.api_key_hash, api_key_hash):
             raise AuthenticationFailed("Invalid device credentials")
 
         return device, None
@@ -0,0 +1,52 @@
+import hashlib
+import uuid
+
+from django.core.cache import cache
+
+# Charts that include the current day are recomputed at least this often, even without new readings
+CHART_CACHE_TIMEOUT = 120
+# Charts of past days can't gain readings (they are stamped on arrival), so they are kept far longer
+SETTLED_CHART_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _chart_version_cache_key(device_id):
+    return f"posture_chart_version:{device_id}"
+
+
+def _live_chart_version_cache_key(device_id):
+    return f"posture_chart_live_version:{device_id}"
+
+
+def _get_version(version_cache_key):
+    return cache.get_or_set(version_cache_key, lambda: uuid.uuid4().hex, None)
+
+
+def get_chart_cache_key(device_id, chart, params, settled=False):
+    """
+    Return the cache key of a chart (stored JSON-encoded) for a device and its resolved query parameters.
+    The key of a settled chart, covering past days only, doesn't change when the device stores a reading.
+    """
+    version = _get_version(_chart_version_cache_key(device_id))
+    if not settled:
+        version += _get_version(_live_chart_version_cache_key(device_id))
+    return f"posture_chart_json:{device_id}:{version}:{chart}:{params}"
+
+
+def get_chart_etag(cache_key):
+    """Return the ETag of the chart cached under cache_key; like the key, it changes when the chart may have"""
+    return f'"{hashlib.blake2b(cache_key.encode(), digest_size=12).hexdigest()}"'
+
+
+def get_cached_chart(cache_key, compute, settled=False):
+    """Return the chart payload cached under cache_key, computing and caching it on a miss"""
+    return cache.get_or_set(cache_key, compute, SETTLED_CHART_CACHE_TIMEOUT if settled else CHART_CACHE_TIMEOUT)
+
+
+def forget_live_charts(device_id):
+    """Retire the cached charts of a device that include the current day, e.g. after a new reading was stored"""
+    cache.set(_live_chart_version_cache_key(device_id), uuid.uuid4().hex, None)
+
+
+def forget_charts(device_id):
+    """Retire every cached chart of a device, e.g. after its readings were removed"""
+    cache.set(_chart_version_cache_key(device_id), uuid.uuid4().hex, None)
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-15 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0014_session_one_active"),
+        ("posture", "0006_remove_posturecomponent_raw_data"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="posturereading",
+            name="request_id",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="posturereading",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("request_id__isnull", False)),
+                fields=("device", "request_id"),
+                name="reading_device_request_uniq",
+            ),
+        ),
+    ]
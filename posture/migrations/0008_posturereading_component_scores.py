@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-15 23:59
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_component_scores(apps, schema_editor):
+    PostureReading = apps.get_model("posture", "PostureReading")
+    PostureComponent = apps.get_model("posture", "PostureComponent")
+
+    def component_score(component_type):
+        return Subquery(
+            PostureComponent.objects.filter(reading=OuterRef("pk"), component_type=component_type).values("score")[:1]
+        )
+
+    PostureReading.objects.update(
+        neck_score=component_score("neck"),
+        torso_score=component_score("torso"),
+        shoulders_score=component_score("shoulders"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posture", "0007_posturereading_request_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="posturereading",
+            name="neck_score",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="posturereading",
+            name="shoulders_score",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="posturereading",
+            name="torso_score",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_component_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2 on 2026-10-15 23:59
+
+from datetime import timezone as dt_timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncHour
+
+
+def backfill_rollups(apps, schema_editor):
+    PostureReading = apps.get_model("posture", "PostureReading")
+    HourlyPostureRollup = apps.get_model("posture", "HourlyPostureRollup")
+
+    hours = (
+        PostureReading.objects.annotate(hour_start=TruncHour("timestamp", tzinfo=dt_timezone.utc))
+        .values("device_id", "hour_start")
+        .annotate(
+            reading_count=Count("id"),
+            overall_total=Sum("overall_score"),
+            neck_total=Sum("neck_score", default=0),
+            neck_count=Count("neck_score"),
+            torso_total=Sum("torso_score", default=0),
+            torso_count=Count("torso_score"),
+            shoulders_total=Sum("shoulders_score", default=0),
+            shoulders_count=Count("shoulders_score"),
+        )
+        .order_by()
+    )
+    HourlyPostureRollup.objects.bulk_create([HourlyPostureRollup(**hour) for hour in hours.iterator()], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0014_session_one_active"),
+        ("posture", "0008_posturereading_component_scores"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HourlyPostureRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hour_start", models.DateTimeField()),
+                ("reading_count", models.IntegerField(default=0)),
+                ("overall_total", models.IntegerField(default=0)),
+                ("neck_total", models.IntegerField(default=0)),
+                ("neck_count", models.IntegerField(default=0)),
+                ("torso_total", models.IntegerField(default=0)),
+                ("torso_count", models.IntegerField(default=0)),
+                ("shoulders_total", models.IntegerField(default=0)),
+                ("shoulders_count", models.IntegerField(default=0)),
+                (
+                    "device",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="posture_rollups",
+                        to="devices.device",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("device", "hour_start"),
+                        name="posture_rollup_device_hour_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-15 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0014_session_one_active"),
+        ("posture", "0009_hourlyposturerollup"),
+    ]
+
+    operations = [
+        # Build the wider index before dropping the old one so lookups are never left without either
+        migrations.AddIndex(
+            model_name="posturereading",
+            index=models.Index(
+                fields=["device", "timestamp", "id"], name="reading_dev_ts_id_idx"
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="posturereading",
+            name="posture_pos_device__b4612e_idx",
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-15 23:59
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posture", "0010_posturereading_cursor_index"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="posturecomponent",
+            name="posture_pos_reading_c1e796_idx",
+        ),
+    ]
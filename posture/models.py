@@ -1,5 +1,6 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import Count, Q, Sum
 
 from devices.models import Device
 
@@ -10,11 +11,25 @@ class PostureReading(models.Model):
     device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name="posture_readings")
     timestamp = models.DateTimeField(auto_now_add=True)
     overall_score = models.IntegerField(validators=[MinValueValidator(0)], default=0)
+    # Copies of the component scores, so charts can average them without joining the components
+    neck_score = models.IntegerField(null=True, blank=True)
+    torso_score = models.IntegerField(null=True, blank=True)
+    shoulders_score = models.IntegerField(null=True, blank=True)
+    # Client-supplied X-Request-ID, so a retried POST doesn't store the reading twice
+    request_id = models.CharField(max_length=64, null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ["-timestamp"]
         indexes = [
-            models.Index(fields=["device", "timestamp"]),
+            # Also orders the cursor-paginated reading lists, so the id tie-breaker is included
+            models.Index(fields=["device", "timestamp", "id"], name="reading_dev_ts_id_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["device", "request_id"],
+                condition=Q(request_id__isnull=False),
+                name="reading_device_request_uniq",
+            ),
         ]
 
     def __str__(self):
@@ -22,10 +37,9 @@ class PostureReading(models.Model):
 
     def calculate_overall_score(self):
         """Calculate the overall score based on component scores"""
-        components = self.components.all()
-        if components:
-            total = sum(component.score for component in components)
-            self.overall_score = total // components.count()
+        totals = self.components.aggregate(total=Sum("score"), count=Count("id"))
+        if totals["count"]:
+            self.overall_score = totals["total"] // totals["count"]
             return self.overall_score
         return 0
 
@@ -44,10 +58,32 @@ class PostureComponent(models.Model):
     score = models.IntegerField(validators=[MinValueValidator(0)])
 
     class Meta:
-        indexes = [
-            models.Index(fields=["reading", "component_type"]),
-        ]
+        # The unique index also serves lookups by reading and component type
         unique_together = ["reading", "component_type"]
 
     def __str__(self):
         return f"{self.get_component_type_display()} for {self.reading}"
+
+
+class HourlyPostureRollup(models.Model):
+    """Score totals of a device's readings per UTC hour, kept current as readings are stored"""
+
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name="posture_rollups")
+    hour_start = models.DateTimeField()
+    reading_count = models.IntegerField(default=0)
+    overall_total = models.IntegerField(default=0)
+    # Components are counted separately, as a reading may lack one of them
+    neck_total = models.IntegerField(default=0)
+    neck_count = models.IntegerField(default=0)
+    torso_total = models.IntegerField(default=0)
+    torso_count = models.IntegerField(default=0)
+    shoulders_total = models.IntegerField(default=0)
+    shoulders_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["device", "hour_start"], name="posture_rollup_device_hour_uniq"),
+        ]
+
+    def __str__(self):
+        return f"Posture rollup for {self.device_id} at {self.hour_start}"
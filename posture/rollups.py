@@ -0,0 +1,74 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Count, F, Sum
+
+from devices.rollups import rollup_hour
+from posture.models import HourlyPostureRollup, PostureReading
+
+_COMPONENT_TYPES = ("neck", "torso", "shoulders")
+
+# Aggregates summing hourly rollup rows into a longer period
+ROLLUP_SUMS = {
+    field: Sum(field)
+    for field in (
+        "reading_count",
+        "overall_total",
+        *(f"{component_type}_{suffix}" for component_type in _COMPONENT_TYPES for suffix in ("total", "count")),
+    )
+}
+
+# The same totals computed straight from readings, for groupings the hourly rollups can't serve
+READING_SUMS = {
+    "reading_count": Count("id"),
+    "overall_total": Sum("overall_score"),
+    **{
+        field: aggregate
+        for component_type in _COMPONENT_TYPES
+        for field, aggregate in (
+            (f"{component_type}_total", Sum(f"{component_type}_score", default=0)),
+            (f"{component_type}_count", Count(f"{component_type}_score")),
+        )
+    },
+}
+
+
+def add_readings_to_rollup(readings):
+    """Add freshly stored readings to the hourly posture rollups of their device and hour"""
+    increments = defaultdict(lambda: defaultdict(int))
+    for reading in readings:
+        hour_increments = increments[reading.device_id, rollup_hour(reading.timestamp)]
+        hour_increments["reading_count"] += 1
+        hour_increments["overall_total"] += reading.overall_score
+        for component_type in _COMPONENT_TYPES:
+            score = getattr(reading, f"{component_type}_score")
+            if score is not None:
+                hour_increments[f"{component_type}_total"] += score
+                hour_increments[f"{component_type}_count"] += 1
+
+    for (device_id, hour_start), hour_increments in increments.items():
+        HourlyPostureRollup.objects.get_or_create(device_id=device_id, hour_start=hour_start)
+        # Increment in SQL so concurrent uploads don't lose updates
+        HourlyPostureRollup.objects.filter(device_id=device_id, hour_start=hour_start).update(
+            **{field: F(field) + increment for field, increment in hour_increments.items()}
+        )
+
+
+def refresh_rollup_hour(device_id, hour_start):
+    """Recompute a device's hourly posture rollup from its readings, e.g. after one of them was edited or deleted"""
+    totals = PostureReading.objects.filter(
+        device_id=device_id, timestamp__gte=hour_start, timestamp__lt=hour_start + timedelta(hours=1)
+    ).aggregate(**READING_SUMS)
+    if totals["reading_count"]:
+        HourlyPostureRollup.objects.update_or_create(device_id=device_id, hour_start=hour_start, defaults=totals)
+    else:
+        HourlyPostureRollup.objects.filter(device_id=device_id, hour_start=hour_start).delete()
+
+
+def rollup_chart_entry(time_marker, totals):
+    """Format summed score totals (see ROLLUP_SUMS and READING_SUMS) as a chart data point"""
+    entry = {"time_marker": time_marker, "overall": round(totals["overall_total"] / totals["reading_count"])}
+    for component_type in _COMPONENT_TYPES:
+        count = totals[f"{component_type}_count"]
+        entry[component_type] = round(totals[f"{component_type}_total"] / count) if count else 0
+    return entry
@@ -1,6 +1,9 @@
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 
+from posture.chart_cache import forget_live_charts
 from posture.models import PostureComponent, PostureReading
+from posture.rollups import add_readings_to_rollup
 
 
 class PostureComponentSerializer(serializers.ModelSerializer):
@@ -9,6 +12,46 @@ class PostureComponentSerializer(serializers.ModelSerializer):
         fields = ["component_type", "score"]
 
 
+# Upper bound on the readings a device may upload in one batch request
+MAX_BATCH_READINGS = 500
+
+
+def get_score_fields(components_data):
+    """
+    Return the score columns of a reading that is about to be written: the overall score
+    (the average of the components) and the copy of each component's score.
+    """
+    component_count = len(components_data)
+    total_score = sum(component_data["score"] for component_data in components_data)
+    score_fields = {
+        f"{component_data['component_type']}_score": component_data["score"] for component_data in components_data
+    }
+    score_fields["overall_score"] = total_score // component_count if component_count > 0 else 0
+    return score_fields
+
+
+class PostureReadingListSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        """Insert a batch of readings with one bulk INSERT for the readings and one for all of their components"""
+        readings = []
+        components = []
+        for reading_data in validated_data:
+            components_data = reading_data.pop("components")
+            reading = PostureReading(**get_score_fields(components_data), **reading_data)
+            readings.append(reading)
+            components.extend(PostureComponent(reading=reading, **component_data) for component_data in components_data)
+
+        with transaction.atomic():
+            # bulk_create() sets the primary keys the components point at
+            PostureReading.objects.bulk_create(readings)
+            PostureComponent.objects.bulk_create(components)
+            add_readings_to_rollup(readings)
+        for device_id in {reading.device_id for reading in readings}:
+            forget_live_charts(device_id)
+
+        return readings
+
+
 class PostureReadingSerializer(serializers.ModelSerializer):
     components = PostureComponentSerializer(many=True)
 
@@ -16,26 +59,30 @@ class PostureReadingSerializer(serializers.ModelSerializer):
         model = PostureReading
         fields = ["device", "timestamp", "overall_score", "components"]
         read_only_fields = ["timestamp", "device", "overall_score"]
+        list_serializer_class = PostureReadingListSerializer
 
     def create(self, validated_data):
         components_data = validated_data.pop("components")
 
-        # First create the reading with default score of 0
-        reading = PostureReading.objects.create(**validated_data)
-
-        # Calculate total score from components
-        total_score = 0
-        component_count = len(components_data)
-
-        # Create all component records
-        for component_data in components_data:
-            PostureComponent.objects.create(reading=reading, **component_data)
-            total_score += component_data["score"]
-
-        # Calculate and save the overall score
-        if component_count > 0:
-            reading.overall_score = total_score // component_count
-            reading.save(update_fields=["overall_score"])
+        # Calculate the scores up front so the reading is written once
+        score_fields = get_score_fields(components_data)
+
+        # Insert the reading and all of its components in one transaction, components in a single INSERT
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    reading = PostureReading.objects.create(**score_fields, **validated_data)
+            except IntegrityError:
+                # A retry of a reading we already stored: hand back the original instead of a duplicate
+                if validated_data.get("request_id") is None:
+                    raise
+                return PostureReading.objects.get(
+                    device=validated_data["device"], request_id=validated_data["request_id"]
+                )
+            # The reading was added to its hourly rollup as it was saved (see posture.signals)
+            PostureComponent.objects.bulk_create(
+                [PostureComponent(reading=reading, **component_data) for component_data in components_data]
+            )
 
         return reading
 
@@ -59,6 +106,17 @@ class PostureReadingSerializer(serializers.ModelSerializer):
         return components
 
 
+class PostureReadingBatchSerializer(serializers.Serializer):
+    """A batch of readings a device uploads in one request"""
+
+    readings = PostureReadingSerializer(many=True, allow_empty=False, max_length=MAX_BATCH_READINGS)
+
+    def create(self, validated_data):
+        device = validated_data["device"]
+        readings = [{**reading_data, "device": device} for reading_data in validated_data["readings"]]
+        return {"readings": self.fields["readings"].create(readings)}
+
+
 class PostureChartDataSerializer(serializers.Serializer):
     """Serializer for aggregated posture chart data"""
 
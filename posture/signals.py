@@ -0,0 +1,70 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from devices.rollups import is_deleting_device_history, rollup_hour
+from posture.chart_cache import forget_charts, forget_live_charts
+from posture.models import PostureComponent, PostureReading
+from posture.rollups import add_readings_to_rollup, refresh_rollup_hour
+from posture.serializers.device_posture_data_serializers import get_score_fields
+
+
+def _deleted_on_its_own(origin, model):
+    """Whether a delete was started on the model itself, not cascaded from a device or reading"""
+    return isinstance(origin, model) or getattr(origin, "model", None) is model
+
+
+def _refresh_rollup_and_charts(device_id, timestamp):
+    refresh_rollup_hour(device_id, rollup_hour(timestamp))
+    # Retired once the change is committed, so a chart computed in between isn't cached under the new version
+    transaction.on_commit(partial(forget_charts, device_id))
+
+
+@receiver(pre_save, sender=PostureReading)
+def remember_stored_hour(sender, instance, **kwargs):
+    """Note where an edited reading was stored, in case the edit moves it to another device or hour"""
+    if instance.pk is not None:
+        instance._stored_hour = PostureReading.objects.filter(pk=instance.pk).values("device_id", "timestamp").first()
+
+
+@receiver(post_save, sender=PostureReading)
+def update_rollup(sender, instance, created, **kwargs):
+    """Keep the hourly posture rollups and the cached charts in step with a saved reading"""
+    if created:
+        # bulk_create() sends no signals, so batch uploads add their readings to the rollups themselves
+        add_readings_to_rollup([instance])
+        transaction.on_commit(partial(forget_live_charts, instance.device_id))
+        return
+
+    stored_hour = getattr(instance, "_stored_hour", None)
+    if stored_hour is not None and (
+        stored_hour["device_id"] != instance.device_id
+        or rollup_hour(stored_hour["timestamp"]) != rollup_hour(instance.timestamp)
+    ):
+        _refresh_rollup_and_charts(stored_hour["device_id"], stored_hour["timestamp"])
+    _refresh_rollup_and_charts(instance.device_id, instance.timestamp)
+
+
+@receiver(post_delete, sender=PostureReading)
+def remove_from_rollup(sender, instance, origin=None, **kwargs):
+    """Take a deleted reading back out of its hourly rollup (a deleted device takes its rollups with it)"""
+    if _deleted_on_its_own(origin, PostureReading) and not is_deleting_device_history():
+        _refresh_rollup_and_charts(instance.device_id, instance.timestamp)
+
+
+@receiver([post_save, post_delete], sender=PostureComponent)
+def update_reading_scores(sender, instance, origin=None, **kwargs):
+    """Recompute the score copies of a reading, and its hourly rollup, when one of its components changes"""
+    if origin is not None and (not _deleted_on_its_own(origin, PostureComponent) or is_deleting_device_history()):
+        return
+
+    components = list(PostureComponent.objects.filter(reading_id=instance.reading_id).values("component_type", "score"))
+    score_fields = {f"{component_type}_score": None for component_type, _ in PostureComponent.COMPONENT_TYPES}
+    score_fields.update(get_score_fields(components))
+    # A queryset update, so the reading's own post_save doesn't refresh the rollup a second time
+    PostureReading.objects.filter(pk=instance.reading_id).update(**score_fields)
+
+    reading = PostureReading.objects.filter(pk=instance.reading_id).values("device_id", "timestamp").first()
+    _refresh_rollup_and_charts(reading["device_id"], reading["timestamp"])
@@ -1 +1,107 @@
-# Create your tests here.
+import pickle
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from devices.models import Device
+from devices.rollups import rollup_hour
+from posture.authentication import _device_auth_cache_key
+from posture.chart_cache import get_chart_cache_key
+from posture.models import HourlyPostureRollup, PostureComponent, PostureReading
+
+
+class DeviceAuthCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.device = Device.objects.create(is_active=True)
+        self.client = APIClient()
+        self.client.credentials(HTTP_X_DEVICE_ID=str(self.device.id), HTTP_X_API_KEY=self.device.api_key)
+
+    def test_cached_device_leaves_out_the_plaintext_key(self):
+        self.assertEqual(self.client.get("/devices/settings/").status_code, 200)
+
+        cached = cache.get(_device_auth_cache_key(self.device.id))
+        self.assertIn("api_key", cached.get_deferred_fields())
+        self.assertNotIn(self.device.api_key.encode(), pickle.dumps(cached))
+
+    def test_saving_the_cached_device_keeps_its_key(self):
+        # Each settings poll saves last_seen on the cached instance
+        for _ in range(2):
+            self.assertEqual(self.client.get("/devices/settings/").status_code, 200)
+
+        stored = Device.objects.get(pk=self.device.pk)
+        self.assertEqual(stored.api_key, self.device.api_key)
+        self.assertEqual(stored.api_key_hash, self.device.api_key_hash)
+        self.assertIsNotNone(stored.last_seen)
+
+
+class PostureRollupMaintenanceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.device = Device.objects.create(is_active=True)
+        self.readings = [
+            self.create_reading(neck, torso, shoulders) for neck, torso, shoulders in ((60, 70, 80), (30, 40, 50))
+        ]
+
+    def create_reading(self, neck, torso, shoulders):
+        reading = PostureReading.objects.create(device=self.device)
+        for component_type, score in (("neck", neck), ("torso", torso), ("shoulders", shoulders)):
+            PostureComponent.objects.create(reading=reading, component_type=component_type, score=score)
+        return reading
+
+    def get_rollup(self):
+        return HourlyPostureRollup.objects.filter(
+            device=self.device, hour_start=rollup_hour(self.readings[0].timestamp)
+        ).first()
+
+    def test_created_readings_are_rolled_up(self):
+        rollup = self.get_rollup()
+        self.assertEqual(rollup.reading_count, 2)
+        self.assertEqual(rollup.overall_total, 70 + 40)
+        self.assertEqual((rollup.neck_total, rollup.neck_count), (60 + 30, 2))
+
+    def test_deleting_a_reading_takes_it_out_of_the_rollup(self):
+        cache_key = get_chart_cache_key(self.device.id, "weekly", "")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.readings[0].delete()
+
+        rollup = self.get_rollup()
+        self.assertEqual(rollup.reading_count, 1)
+        self.assertEqual(rollup.overall_total, 40)
+        self.assertEqual((rollup.shoulders_total, rollup.shoulders_count), (50, 1))
+        self.assertNotEqual(get_chart_cache_key(self.device.id, "weekly", ""), cache_key)
+
+    def test_deleting_the_last_readings_removes_the_rollup(self):
+        PostureReading.objects.filter(device=self.device).delete()
+        self.assertIsNone(self.get_rollup())
+
+    def test_editing_a_component_updates_the_reading_and_rollup(self):
+        component = self.readings[0].components.get(component_type="neck")
+        component.score = 90
+        component.save()
+
+        reading = PostureReading.objects.get(pk=self.readings[0].pk)
+        self.assertEqual((reading.neck_score, reading.overall_score), (90, (90 + 70 + 80) // 3))
+        rollup = self.get_rollup()
+        self.assertEqual(rollup.neck_total, 90 + 30)
+        self.assertEqual(rollup.overall_total, 80 + 40)
+
+    def test_deleting_a_component_clears_its_score_copy(self):
+        self.readings[1].components.get(component_type="torso").delete()
+
+        reading = PostureReading.objects.get(pk=self.readings[1].pk)
+        self.assertEqual((reading.torso_score, reading.overall_score), (None, (30 + 50) // 2))
+        rollup = self.get_rollup()
+        self.assertEqual((rollup.torso_total, rollup.torso_count), (70, 1))
+        self.assertEqual(rollup.overall_total, 70 + 40)
+
+    def test_moving_a_reading_refreshes_both_hours(self):
+        reading = PostureReading.objects.get(pk=self.readings[0].pk)
+        reading.timestamp -= timedelta(hours=2)
+        reading.save()
+
+        self.assertEqual(self.get_rollup().reading_count, 1)
+        moved = HourlyPostureRollup.objects.get(device=self.device, hour_start=rollup_hour(reading.timestamp))
+        self.assertEqual((moved.reading_count, moved.overall_total), (1, 70))
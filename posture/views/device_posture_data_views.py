@@ -1,11 +1,17 @@
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter, OpenApiResponse, extend_schema, extend_schema_view
-from rest_framework import mixins, permissions, viewsets
-from rest_framework.exceptions import PermissionDenied
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
 
-from devices.models import Device, Session
+from devices.models import Device
 from posture.authentication import DeviceAPIKeyAuthentication  # custom auth
 from posture.models import PostureReading
-from posture.serializers.device_posture_data_serializers import PostureReadingSerializer
+from posture.serializers.device_posture_data_serializers import (
+    MAX_BATCH_READINGS,
+    PostureReadingBatchSerializer,
+    PostureReadingSerializer,
+)
 
 
 class IsDeviceAuthenticated(permissions.BasePermission):
@@ -55,6 +61,71 @@ class IsDeviceAuthenticated(permissions.BasePermission):
                 request_only=True,
             )
         ],
+        parameters=[
+            OpenApiParameter(
+                name="X-Device-ID",
+                location=OpenApiParameter.HEADER,
+                required=True,
+                type=str,
+                description="UUID of the device",
+            ),
+            OpenApiParameter(
+                name="X-API-KEY",
+                location=OpenApiParameter.HEADER,
+                required=True,
+                type=str,
+                description="API key associated with the device",
+            ),
+            OpenApiParameter(
+                name="X-Request-ID",
+                location=OpenApiParameter.HEADER,
+                required=False,
+                type=str,
+                description="Optional idempotency key (up to 64 characters); a retried POST with the same key "
+                "returns the stored reading instead of creating another",
+            ),
+        ],
+        auth=[],
+    ),
+    batch_create=extend_schema(
+        tags=["devices-api"],
+        description=(
+            f"Submit up to {MAX_BATCH_READINGS} posture readings from a Raspberry Pi device in one request. "
+            "There must be an active session to send data to the server. The readings are stored in the order "
+            "they are listed and all share the time the batch arrived. "
+            "Requires `X-Device-ID` and `X-API-KEY` headers for authentication."
+        ),
+        summary="Submit a batch of posture data",
+        request=PostureReadingBatchSerializer,
+        responses={
+            201: OpenApiResponse(description="Readings stored; returns the number of readings created"),
+            400: OpenApiResponse(description="Invalid data or authentication"),
+            403: OpenApiResponse(description="Authentication failed or device not active"),
+        },
+        examples=[
+            OpenApiExample(
+                name="Batch Example",
+                value={
+                    "readings": [
+                        {
+                            "components": [
+                                {"component_type": "neck", "score": 65},
+                                {"component_type": "torso", "score": 90},
+                                {"component_type": "shoulders", "score": 70},
+                            ]
+                        },
+                        {
+                            "components": [
+                                {"component_type": "neck", "score": 60},
+                                {"component_type": "torso", "score": 85},
+                                {"component_type": "shoulders", "score": 72},
+                            ]
+                        },
+                    ]
+                },
+                request_only=True,
+            )
+        ],
         parameters=[
             OpenApiParameter(
                 name="X-Device-ID",
@@ -72,7 +143,7 @@ class IsDeviceAuthenticated(permissions.BasePermission):
             ),
         ],
         auth=[],
-    )
+    ),
 )
 class PostureDataViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
     """
@@ -106,10 +177,29 @@ class PostureDataViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
         device = self.request.user
 
         # Check if device has an active session
-        has_active_session = Session.objects.filter(device=device, end_time__isnull=True).exists()
-
-        if not has_active_session:
+        if not device.in_session:
             raise PermissionDenied("Device must have an active session to submit posture data.")
 
+        request_id = self.request.headers.get("X-Request-ID") or None
+        if request_id is not None and len(request_id) > 64:
+            raise ValidationError({"X-Request-ID": "Must be at most 64 characters."})
+
         # If active session exists, proceed to save the posture reading
-        serializer.save(device=device)
+        serializer.save(device=device, request_id=request_id)
+
+    @action(detail=False, methods=["post"], url_path="batch")
+    def batch_create(self, request):
+        """
+        Store a batch of readings with one INSERT for the readings and one for their components.
+        """
+        serializer = PostureReadingBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        device = request.user
+
+        # Check if device has an active session
+        if not device.in_session:
+            raise PermissionDenied("Device must have an active session to submit posture data.")
+
+        readings = serializer.save(device=device)["readings"]
+        return Response({"created": len(readings)}, status=status.HTTP_201_CREATED)
@@ -1,18 +1,58 @@
-from datetime import datetime, timedelta
-
-from django.db.models import Avg
-from django.db.models.functions import TruncDay, TruncWeek
-from django.shortcuts import get_object_or_404
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+
+import orjson
+from django.db.models import ExpressionWrapper, IntegerField
+from django.db.models.functions import ExtractHour, ExtractMinute, TruncDay, TruncWeek
+from django.http import HttpResponse
+from django.utils import timezone
 from django.utils.dateparse import parse_date
+from django.utils.http import parse_etags
 from drf_spectacular.utils import OpenApiParameter, OpenApiTypes, extend_schema, extend_schema_view
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 
-from devices.models import Device
-from posture.models import PostureComponent, PostureReading
+from custom_permissions.custom_permissions import get_device_owner_id
+from posture.chart_cache import get_cached_chart, get_chart_cache_key, get_chart_etag
+from posture.models import HourlyPostureRollup, PostureReading
+from posture.rollups import READING_SUMS, ROLLUP_SUMS, rollup_chart_entry
 from posture.serializers.device_posture_data_serializers import PostureChartDataSerializer, PostureReadingSerializer
+from utils.renderers import ORJSONRenderer
+
+
+@lru_cache(maxsize=1024)
+def parse_date_param(value):
+    """
+    Parse a YYYY-MM-DD query parameter, returning None if it is malformed or not a real date.
+    Dashboards repeat the same few dates, so parsed values are memoized.
+    """
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+
+def day_bounds(first_day, last_day=None):
+    """
+    Return the first and last aware instants of a range of whole local days (a single day by default).
+    Filtering timestamps on these, rather than on their __date, keeps the lookups index range scans.
+    """
+    return (
+        timezone.make_aware(datetime.combine(first_day, time.min)),
+        timezone.make_aware(datetime.combine(last_day or first_day, time.max)),
+    )
+
+
+class PostureReadingCursorPagination(CursorPagination):
+    """Keyset pagination over a device's readings, newest first, so deep pages stay index range scans"""
+
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    ordering = ("-timestamp", "-id")
 
 
 @extend_schema_view(
@@ -48,16 +88,38 @@ class UserPostureDataByDeviceViewSet(viewsets.ReadOnlyModelViewSet):
 
     serializer_class = PostureReadingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
+    pagination_class = PostureReadingCursorPagination
 
-    def get_device(self):
-        """Get and validate the device belongs to the requesting user."""
+    def get_device_id(self):
+        """Validate the device belongs to the requesting user and return its id."""
         device_id = self.kwargs.get("device_id")
-        device = get_object_or_404(Device, id=device_id)
 
-        if device.user != self.request.user:
+        # The owner comes from the cache, so the check usually skips the database
+        if get_device_owner_id(device_id) != self.request.user.id:
             raise PermissionDenied(detail="You do not have access to this device's data.")
 
-        return device
+        return device_id
+
+    def chart_response(self, request, device_id, chart, params, last_day, compute):
+        """
+        Respond with a chart from the cache (computing it on a miss), or with 304 Not Modified when the
+        client's ETag still matches. Clients revalidate on every use, which costs no chart queries.
+        """
+        # New readings are stamped with the current time, so a chart ending on an earlier day is settled
+        settled = last_day < timezone.localdate()
+        cache_key = get_chart_cache_key(device_id, chart, params, settled)
+        etag = get_chart_etag(cache_key)
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            # The chart is a flat list of scalars, so cache it encoded and skip the renderer
+            payload = get_cached_chart(cache_key, lambda: orjson.dumps(compute()), settled)
+            response = HttpResponse(payload, content_type="application/json")
+
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
 
     def validate_date_params(self):
         """Validate date parameters and check for conflicting filters."""
@@ -72,7 +134,7 @@ class UserPostureDataByDeviceViewSet(viewsets.ReadOnlyModelViewSet):
         # Process single date
         date = None
         if date_str:
-            date = parse_date(date_str)
+            date = parse_date_param(date_str)
             if not date:
                 raise ValidationError({"date": f"Invalid date format: {date_str}. Use YYYY-MM-DD."})
 
@@ -81,12 +143,12 @@ class UserPostureDataByDeviceViewSet(viewsets.ReadOnlyModelViewSet):
         end_date = None
         if start_date_str or end_date_str:
             if start_date_str:
-                start_date = parse_date(start_date_str)
+                start_date = parse_date_param(start_date_str)
                 if not start_date:
                     raise ValidationError({"start_date": f"Invalid date format: {start_date_str}. Use YYYY-MM-DD."})
 
             if end_date_str:
-                end_date = parse_date(end_date_str)
+                end_date = parse_date_param(end_date_str)
                 if not end_date:
                     raise ValidationError({"end_date": f"Invalid date format: {end_date_str}. Use YYYY-MM-DD."})
 
@@ -99,15 +161,15 @@ class UserPostureDataByDeviceViewSet(viewsets.ReadOnlyModelViewSet):
     def apply_date_filters(self, queryset, dates):
         """Apply date filters to the queryset."""
         if dates["date"]:
-            return queryset.filter(timestamp__date=dates["date"])
+            return queryset.filter(timestamp__range=day_bounds(dates["date"]))
 
         elif dates["start_date"] or dates["end_date"]:
             if dates["start_date"] and dates["end_date"]:
-                return queryset.filter(timestamp__date__range=(dates["start_date"], dates["end_date"]))
+                return queryset.filter(timestamp__range=day_bounds(dates["start_date"], dates["end_date"]))
             elif dates["start_date"]:
-                return queryset.filter(timestamp__date__gte=dates["start_date"])
+                return queryset.filter(timestamp__gte=day_bounds(dates["start_date"])[0])
             else:  # Only end_date
-                return queryset.filter(timestamp__date__lte=dates["end_date"])
+                return queryset.filter(timestamp__lte=day_bounds(dates["end_date"])[1])
 
         return queryset
 
@@ -115,27 +177,37 @@ class UserPostureDataByDeviceViewSet(viewsets.ReadOnlyModelViewSet):
         """Override list method to handle validation errors properly."""
         try:
             # First check device ownership
-            device = self.get_device()
+            device_id = self.get_device_id()
 
             # Validate and parse date parameters
             dates = self.validate_date_params()
 
-            # Base queryset - using prefetch_related to optimize component queries
-            queryset = PostureReading.objects.filter(device=device).prefetch_related(
-                "components"  # Prefetch related components for performance
+            # Like the charts, the list only changes when the device stores a reading, so a client
+            # polling with the ETag of its last page gets a 304 without any reading query
+            etag = get_chart_etag(get_chart_cache_key(device_id, "list", request.get_full_path()))
+            if etag in parse_etags(request.headers.get("If-None-Match", "")):
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+                response["ETag"] = etag
+                return response
+
+            # Base queryset - loading only the columns the serializer outputs, with the components prefetched
+            queryset = (
+                PostureReading.objects.filter(device_id=device_id)
+                .only("id", "device_id", "timestamp", "overall_score")
+                .prefetch_related("components")
             )
 
             # Apply date filters
             queryset = self.apply_date_filters(queryset, dates)
 
-            # Order by timestamp for consistent results
-            queryset = queryset.order_by("-timestamp")
-
             # Set the queryset for pagination and serialization
             self.queryset = queryset
 
             # Continue with the standard list processing
-            return super().list(request, *args, **kwargs)
+            response = super().list(request, *args, **kwargs)
+            response["ETag"] = etag
+            response["Cache-Control"] = "private, no-cache"
+            return response
 
         except ValidationError as e:
             return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
@@ -171,16 +243,16 @@ class UserPostureDataByDeviceViewSet(viewsets.ReadOnlyModelViewSet):
     def daily_chart(self, request, *args, **kwargs):
         """Return aggregated data for a specific day using configurable interval."""
         try:
-            device = self.get_device()
+            device_id = self.get_device_id()
 
             # Get date from query params or use today's date
             date_str = request.query_params.get("date")
             if date_str:
-                chart_date = parse_date(date_str)
+                chart_date = parse_date_param(date_str)
                 if not chart_date:
                     raise ValidationError({"date": f"Invalid date format: {date_str}. Use YYYY-MM-DD."})
             else:
-                chart_date = datetime.now().date()
+                chart_date = timezone.localdate()
 
             # Get interval from query params (in minutes)
             try:
@@ -190,73 +262,58 @@ class UserPostureDataByDeviceViewSet(viewsets.ReadOnlyModelViewSet):
             except ValueError:
                 raise ValidationError({"interval": "Interval must be a valid integer."})
 
-            # Get all readings for the day with their components in one efficient query
-            readings = (
-                PostureReading.objects.filter(device=device, timestamp__date=chart_date)
-                .prefetch_related("components")
-                .order_by("timestamp")
+            # Served from the cache until the device stores a new reading (for past days, until it is released)
+            return self.chart_response(
+                request,
+                device_id,
+                "daily",
+                f"{chart_date}:{interval}",
+                chart_date,
+                lambda: self.build_daily_chart(device_id, chart_date, interval),
             )
 
-            # Group readings by interval
-            interval_data = {}
-
-            for reading in readings:
-                # Get interval timestamp (rounded down to nearest interval)
-                minutes_since_midnight = reading.timestamp.hour * 60 + reading.timestamp.minute
-                interval_group = minutes_since_midnight // interval
-
-                # Calculate the hour and minute for this interval
-                interval_hour = (interval_group * interval) // 60
-                interval_minute = (interval_group * interval) % 60
-                time_marker = f"{interval_hour:02d}:{interval_minute:02d}"
-
-                # Initialize interval data if needed
-                if time_marker not in interval_data:
-                    interval_data[time_marker] = {
-                        "overall_scores": [],
-                        "neck_scores": [],
-                        "torso_scores": [],
-                        "shoulders_scores": [],
-                    }
-
-                # Add overall score
-                interval_data[time_marker]["overall_scores"].append(reading.overall_score)
-
-                # Add component scores
-                for component in reading.components.all():
-                    if component.component_type == "neck":
-                        interval_data[time_marker]["neck_scores"].append(component.score)
-                    elif component.component_type == "torso":
-                        interval_data[time_marker]["torso_scores"].append(component.score)
-                    elif component.component_type == "shoulders":
-                        interval_data[time_marker]["shoulders_scores"].append(component.score)
-
-            # Calculate averages and format for frontend
-            chart_data = []
-            for time_marker, data in sorted(interval_data.items()):
-                # Calculate averages or use 0 if no data
-                overall_avg = sum(data["overall_scores"]) / len(data["overall_scores"]) if data["overall_scores"] else 0
-                neck_avg = sum(data["neck_scores"]) / len(data["neck_scores"]) if data["neck_scores"] else 0
-                torso_avg = sum(data["torso_scores"]) / len(data["torso_scores"]) if data["torso_scores"] else 0
-                shoulders_avg = (
-                    sum(data["shoulders_scores"]) / len(data["shoulders_scores"]) if data["shoulders_scores"] else 0
-                )
-
-                chart_data.append(
-                    {
-                        "time_marker": time_marker,
-                        "overall": round(overall_avg),
-                        "neck": round(neck_avg),
-                        "torso": round(torso_avg),
-                        "shoulders": round(shoulders_avg),
-                    }
-                )
-
-            return Response(chart_data)
-
         except ValidationError as e:
             return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
 
+    def build_daily_chart(self, device_id, chart_date, interval):
+        """Aggregate a day's readings into intervals of the given number of minutes."""
+        if interval % 60 == 0:
+            return self.build_daily_chart_from_rollups(device_id, chart_date, interval // 60)
+
+        # Group the day's readings by interval and sum their scores in one query
+        minute_of_day = ExtractHour("timestamp") * 60 + ExtractMinute("timestamp")
+        interval_data = (
+            PostureReading.objects.filter(device_id=device_id, timestamp__range=day_bounds(chart_date))
+            .annotate(interval_group=ExpressionWrapper(minute_of_day / interval, output_field=IntegerField()))
+            .values("interval_group")
+            .annotate(**READING_SUMS)
+            .order_by("interval_group")
+        )
+
+        # Format for frontend, labelling each interval with its start time
+        chart_data = []
+        for entry in interval_data:
+            interval_hour, interval_minute = divmod(entry["interval_group"] * interval, 60)
+            chart_data.append(rollup_chart_entry(f"{interval_hour:02d}:{interval_minute:02d}", entry))
+
+        return chart_data
+
+    def build_daily_chart_from_rollups(self, device_id, chart_date, interval_hours):
+        """Aggregate a day's readings into intervals of whole hours, summing the hourly rollups."""
+        intervals = {}
+        rollups = HourlyPostureRollup.objects.filter(
+            device_id=device_id, hour_start__range=day_bounds(chart_date)
+        ).values("hour_start", *ROLLUP_SUMS)
+        for rollup in rollups:
+            interval_hour = rollup["hour_start"].hour // interval_hours * interval_hours
+            totals = intervals.setdefault(interval_hour, dict.fromkeys(ROLLUP_SUMS, 0))
+            for field in ROLLUP_SUMS:
+                totals[field] += rollup[field]
+
+        return [
+            rollup_chart_entry(f"{interval_hour:02d}:00", totals) for interval_hour, totals in sorted(intervals.items())
+        ]
+
     @extend_schema(
         tags=["posture-data-user"],
         parameters=[
@@ -279,22 +336,22 @@ class UserPostureDataByDeviceViewSet(viewsets.ReadOnlyModelViewSet):
     def weekly_chart(self, request, *args, **kwargs):
         """Return daily aggregated data for a week for charting."""
         try:
-            device = self.get_device()
+            device_id = self.get_device_id()
 
             # Get date range from query params or use last 7 days
             start_date_str = request.query_params.get("start_date")
             end_date_str = request.query_params.get("end_date")
 
-            today = datetime.now().date()
+            today = timezone.localdate()
             if start_date_str:
-                start_date = parse_date(start_date_str)
+                start_date = parse_date_param(start_date_str)
                 if not start_date:
                     raise ValidationError({"start_date": f"Invalid date format: {start_date_str}. Use YYYY-MM-DD."})
             else:
                 start_date = today - timedelta(days=6)  # Last 7 days including today
 
             if end_date_str:
-                end_date = parse_date(end_date_str)
+                end_date = parse_date_param(end_date_str)
                 if not end_date:
                     raise ValidationError({"end_date": f"Invalid date format: {end_date_str}. Use YYYY-MM-DD."})
             else:
@@ -303,66 +360,33 @@ class UserPostureDataByDeviceViewSet(viewsets.ReadOnlyModelViewSet):
             if start_date > end_date:
                 raise ValidationError({"error": "'start_date' cannot be after 'end_date'"})
 
-            # Get base queryset for the date range
-            queryset = PostureReading.objects.filter(device=device, timestamp__date__range=(start_date, end_date))
-
-            # Get component scores by type
-            neck_scores = PostureComponent.objects.filter(reading__in=queryset, component_type="neck").values("reading")
-
-            torso_scores = PostureComponent.objects.filter(reading__in=queryset, component_type="torso").values(
-                "reading"
+            # Served from the cache until the device stores a new reading (for past days, until it is released)
+            return self.chart_response(
+                request,
+                device_id,
+                "weekly",
+                f"{start_date}:{end_date}",
+                end_date,
+                lambda: self.build_weekly_chart(device_id, start_date, end_date),
             )
 
-            shoulders_scores = PostureComponent.objects.filter(reading__in=queryset, component_type="shoulders").values(
-                "reading"
-            )
-
-            # Aggregate by day
-            daily_data = (
-                queryset.annotate(day=TruncDay("timestamp"))
-                .values("day")
-                .annotate(overall=Avg("overall_score"))
-                .order_by("day")
-            )
-
-            # Format for frontend
-            chart_data = []
-            for entry in daily_data:
-                day_str = entry["day"].strftime("%a")  # Short day name (Mon, Tue, etc.)
-
-                # Find component scores for this day
-                day_neck = (
-                    neck_scores.filter(reading__timestamp__date=entry["day"].date()).aggregate(avg=Avg("score"))["avg"]
-                    or 0
-                )
-
-                day_torso = (
-                    torso_scores.filter(reading__timestamp__date=entry["day"].date()).aggregate(avg=Avg("score"))["avg"]
-                    or 0
-                )
-
-                day_shoulders = (
-                    shoulders_scores.filter(reading__timestamp__date=entry["day"].date()).aggregate(avg=Avg("score"))[
-                        "avg"
-                    ]
-                    or 0
-                )
-
-                chart_data.append(
-                    {
-                        "time_marker": day_str,
-                        "overall": round(entry["overall"]),
-                        "neck": round(day_neck),
-                        "torso": round(day_torso),
-                        "shoulders": round(day_shoulders),
-                    }
-                )
-
-            return Response(chart_data)
-
         except ValidationError as e:
             return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
 
+    def build_weekly_chart(self, device_id, start_date, end_date):
+        """Aggregate the readings of a date range by day."""
+        # Sum the hourly rollups of the date range by day
+        daily_data = (
+            HourlyPostureRollup.objects.filter(device_id=device_id, hour_start__range=day_bounds(start_date, end_date))
+            .annotate(day=TruncDay("hour_start"))
+            .values("day")
+            .annotate(**ROLLUP_SUMS)
+            .order_by("day")
+        )
+
+        # Format for frontend, with short day names (Mon, Tue, etc.)
+        return [rollup_chart_entry(entry["day"].strftime("%a"), entry) for entry in daily_data]
+
     @extend_schema(
         tags=["posture-data-user"],
         parameters=[
@@ -385,22 +409,22 @@ class UserPostureDataByDeviceViewSet(viewsets.ReadOnlyModelViewSet):
     def monthly_chart(self, request, *args, **kwargs):
         """Return weekly aggregated data for a month for charting."""
         try:
-            device = self.get_device()
+            device_id = self.get_device_id()
 
             # Get date range from query params or use last 4 weeks
             start_date_str = request.query_params.get("start_date")
             end_date_str = request.query_params.get("end_date")
 
-            today = datetime.now().date()
+            today = timezone.localdate()
             if start_date_str:
-                start_date = parse_date(start_date_str)
+                start_date = parse_date_param(start_date_str)
                 if not start_date:
                     raise ValidationError({"start_date": f"Invalid date format: {start_date_str}. Use YYYY-MM-DD."})
             else:
                 start_date = today - timedelta(weeks=4)
 
             if end_date_str:
-                end_date = parse_date(end_date_str)
+                end_date = parse_date_param(end_date_str)
                 if not end_date:
                     raise ValidationError({"end_date": f"Invalid date format: {end_date_str}. Use YYYY-MM-DD."})
             else:
@@ -409,67 +433,29 @@ class UserPostureDataByDeviceViewSet(viewsets.ReadOnlyModelViewSet):
             if start_date > end_date:
                 raise ValidationError({"error": "'start_date' cannot be after 'end_date'"})
 
-            # Get base queryset for the date range
-            queryset = PostureReading.objects.filter(device=device, timestamp__date__range=(start_date, end_date))
-
-            # Get component scores by type
-            neck_scores = PostureComponent.objects.filter(reading__in=queryset, component_type="neck").values("reading")
-
-            torso_scores = PostureComponent.objects.filter(reading__in=queryset, component_type="torso").values(
-                "reading"
-            )
-
-            shoulders_scores = PostureComponent.objects.filter(reading__in=queryset, component_type="shoulders").values(
-                "reading"
+            # Served from the cache until the device stores a new reading (for past days, until it is released)
+            return self.chart_response(
+                request,
+                device_id,
+                "monthly",
+                f"{start_date}:{end_date}",
+                end_date,
+                lambda: self.build_monthly_chart(device_id, start_date, end_date),
             )
 
-            # Aggregate by week
-            weekly_data = (
-                queryset.annotate(week=TruncWeek("timestamp"))
-                .values("week")
-                .annotate(overall=Avg("overall_score"))
-                .order_by("week")
-            )
-
-            # Format for frontend
-            chart_data = []
-            for i, entry in enumerate(weekly_data):
-                week_str = f"Week {i + 1}"
-                week_date = entry["week"].date()
-
-                # Find component scores for this week
-                week_neck = (
-                    neck_scores.filter(
-                        reading__timestamp__date__range=(week_date, week_date + timedelta(days=6))
-                    ).aggregate(avg=Avg("score"))["avg"]
-                    or 0
-                )
-
-                week_torso = (
-                    torso_scores.filter(
-                        reading__timestamp__date__range=(week_date, week_date + timedelta(days=6))
-                    ).aggregate(avg=Avg("score"))["avg"]
-                    or 0
-                )
-
-                week_shoulders = (
-                    shoulders_scores.filter(
-                        reading__timestamp__date__range=(week_date, week_date + timedelta(days=6))
-                    ).aggregate(avg=Avg("score"))["avg"]
-                    or 0
-                )
-
-                chart_data.append(
-                    {
-                        "time_marker": week_str,
-                        "overall": round(entry["overall"]),
-                        "neck": round(week_neck),
-                        "torso": round(week_torso),
-                        "shoulders": round(week_shoulders),
-                    }
-                )
-
-            return Response(chart_data)
-
         except ValidationError as e:
             return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
+    def build_monthly_chart(self, device_id, start_date, end_date):
+        """Aggregate the readings of a date range by week."""
+        # Sum the hourly rollups of the date range by week
+        weekly_data = (
+            HourlyPostureRollup.objects.filter(device_id=device_id, hour_start__range=day_bounds(start_date, end_date))
+            .annotate(week=TruncWeek("hour_start"))
+            .values("week")
+            .annotate(**ROLLUP_SUMS)
+            .order_by("week")
+        )
+
+        # Format for frontend
+        return [rollup_chart_entry(f"Week {i + 1}", entry) for i, entry in enumerate(weekly_data)]
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RanksConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "ranks"
+
+    def ready(self):
+        from ranks import signals  # noqa: F401
@@ -22,8 +22,7 @@ def create_default_ranks(apps, schema_editor):
         {'name': 'DIAMOND', 'minimum_score': 2400},  # Achievable in ~40-50 good sessions
     ]
 
-    for tier in default_tiers:
-        RankTier.objects.create(**tier)
+    RankTier.objects.bulk_create([RankTier(**tier) for tier in default_tiers])
 
 
 def delete_default_ranks(apps, schema_editor):
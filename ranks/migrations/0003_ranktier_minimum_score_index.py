@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-15 22:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ranks", "0002_populate_rank_tiers"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="ranktier",
+            index=models.Index(fields=["minimum_score"], name="ranktier_min_score_idx"),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-15 23:59
+
+from django.db import migrations, models
+
+
+def merge_duplicate_tiers(apps, schema_editor):
+    RankTier = apps.get_model("ranks", "RankTier")
+    UserRank = apps.get_model("ranks", "UserRank")
+
+    # Keep the oldest tier of each name; ranks are moved onto it first, as deleting a tier cascades to its ranks
+    kept_tiers = {}
+    for tier_id, name in RankTier.objects.order_by("id").values_list("id", "name"):
+        if name in kept_tiers:
+            UserRank.objects.filter(tier_id=tier_id).update(tier_id=kept_tiers[name])
+            RankTier.objects.filter(id=tier_id).delete()
+        else:
+            kept_tiers[name] = tier_id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ranks", "0003_ranktier_minimum_score_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tiers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="ranktier",
+            name="name",
+            field=models.CharField(
+                choices=[
+                    ("NONE", "None"),
+                    ("BRONZE", "Bronze"),
+                    ("SILVER", "Silver"),
+                    ("GOLD", "Gold"),
+                    ("PLATINUM", "Platinum"),
+                    ("DIAMOND", "Diamond"),
+                ],
+                max_length=20,
+                unique=True,
+            ),
+        ),
+    ]
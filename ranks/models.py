@@ -16,7 +16,7 @@ class RankTier(models.Model):
         ("DIAMOND", "Diamond"),
     ]
 
-    name = models.CharField(max_length=20, choices=TIER_CHOICES)
+    name = models.CharField(max_length=20, choices=TIER_CHOICES, unique=True)
     minimum_score = models.IntegerField()
 
     def __str__(self):
@@ -24,6 +24,9 @@ class RankTier(models.Model):
 
     class Meta:
         ordering = ["minimum_score"]
+        indexes = [
+            models.Index(fields=["minimum_score"], name="ranktier_min_score_idx"),
+        ]
 
 
 class UserRank(models.Model):
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
 from ranks.models import RankTier, UserRank
+from ranks.tiers import get_next_tier
 
 
 class RankTierSerializer(serializers.ModelSerializer):
@@ -23,7 +24,7 @@ class NextRankInfoSerializer(serializers.Serializer):
 class UserRankSerializer(serializers.ModelSerializer):
     """Serializer for UserRank model"""
 
-    user = serializers.StringRelatedField()
+    user = serializers.CharField(source="user.username", read_only=True)
     tier = RankTierSerializer()
     next_tier = NextRankInfoSerializer(read_only=True)
 
@@ -36,8 +37,8 @@ class UserRankSerializer(serializers.ModelSerializer):
         """Add next tier information to the serialized data"""
         representation = super().to_representation(instance)
 
-        # Get the next rank tier
-        next_tier = RankTier.objects.filter(minimum_score__gt=instance.current_score).order_by("minimum_score").first()
+        # Get the next rank tier from the cached tier ladder
+        next_tier = get_next_tier(instance.current_score)
 
         if next_tier:
             representation["next_tier"] = {
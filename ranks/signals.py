@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ranks.models import RankTier
+from ranks.tiers import clear_tier_cache
+
+
+@receiver([post_save, post_delete], sender=RankTier)
+def reset_tier_cache(sender, **kwargs):
+    """Drop the cached tier ladder whenever a tier is added, edited or removed"""
+    clear_tier_cache()
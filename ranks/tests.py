@@ -1,3 +1,28 @@
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from ranks.models import RankTier
+from ranks.tiers import TIER_LADDER_VERSION_CACHE_KEY, get_next_tier, get_tier_for_score, get_tier_ladder
+
+
+class TierLadderCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ladder = get_tier_ladder()
+
+    def test_edited_tier_is_read_back(self):
+        tier = RankTier.objects.get(pk=self.ladder[-1].pk)
+        tier.minimum_score += 1
+        tier.save()
+
+        self.assertEqual(get_tier_ladder()[-1].minimum_score, tier.minimum_score)
+        self.assertEqual(get_next_tier(tier.minimum_score - 1), tier)
+        self.assertNotEqual(get_tier_for_score(tier.minimum_score - 1), tier)
+
+    def test_tier_edited_by_another_worker_is_read_back(self):
+        # Another worker saves the tier: this process gets no signal, only the new version in the shared cache
+        top_tier = self.ladder[-1]
+        RankTier.objects.filter(pk=top_tier.pk).update(minimum_score=top_tier.minimum_score + 1)
+        cache.set(TIER_LADDER_VERSION_CACHE_KEY, "bumped by another worker", None)
+
+        self.assertEqual(get_tier_ladder()[-1].minimum_score, top_tier.minimum_score + 1)
@@ -0,0 +1,62 @@
+import uuid
+from bisect import bisect_right
+
+from django.core.cache import cache
+
+from ranks.models import RankTier
+
+# Shared by every worker and replaced whenever a tier changes, so each one reloads the ladder from the new key
+TIER_LADDER_VERSION_CACHE_KEY = "rank_tier_ladder_version"
+TIER_LADDER_CACHE_TIMEOUT = 60 * 60 * 24
+
+# This process's copy of the ladder as (version, ladder, thresholds, NONE tier), reused while the version holds
+_process_ladder = (None, (), [], None)
+
+
+def _get_loaded_ladder():
+    global _process_ladder
+    version = cache.get_or_set(TIER_LADDER_VERSION_CACHE_KEY, lambda: uuid.uuid4().hex, None)
+    if _process_ladder[0] != version:
+        ladder = cache.get_or_set(
+            f"rank_tier_ladder:{version}",
+            lambda: tuple(RankTier.objects.order_by("minimum_score")),
+            TIER_LADDER_CACHE_TIMEOUT,
+        )
+        thresholds = [tier.minimum_score for tier in ladder]
+        none_tier = next((tier for tier in ladder if tier.name == "NONE"), None)
+        _process_ladder = (version, ladder, thresholds, none_tier)
+    return _process_ladder
+
+
+def get_tier_ladder():
+    """Return all rank tiers ordered by minimum score (cached until a tier changes)"""
+    return _get_loaded_ladder()[1]
+
+
+def get_tier_thresholds():
+    """Return the minimum scores of the tier ladder, for bisecting"""
+    return _get_loaded_ladder()[2]
+
+
+def get_none_tier():
+    """Return the NONE tier new ranks start in, or None if it hasn't been seeded"""
+    return _get_loaded_ladder()[3]
+
+
+def get_tier_for_score(score):
+    """Return the highest tier whose minimum score is reached, or None if none is"""
+    _, ladder, thresholds, _ = _get_loaded_ladder()
+    tier_index = bisect_right(thresholds, score)
+    return ladder[tier_index - 1] if tier_index else None
+
+
+def get_next_tier(score):
+    """Return the lowest tier whose minimum score is above score, or None at the top of the ladder"""
+    _, ladder, thresholds, _ = _get_loaded_ladder()
+    tier_index = bisect_right(thresholds, score)
+    return ladder[tier_index] if tier_index < len(ladder) else None
+
+
+def clear_tier_cache():
+    """Retire the cached tier ladder in every worker, e.g. after a tier was edited"""
+    cache.set(TIER_LADDER_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
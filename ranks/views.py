@@ -1,5 +1,13 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.http import parse_etags
 from drf_spectacular.utils import extend_schema, extend_schema_view
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, status
+
+from ranks.tiers import get_tier_ladder
+from utils.renderers import ORJSONRenderer
 
 from .models import UserRank
 from .serializers import UserRankSerializer
@@ -12,6 +20,7 @@ from .serializers import UserRankSerializer
         tags=["ranks"],
         responses={
             200: UserRankSerializer(many=True),
+            304: {"description": "Ranks unchanged since the ETag sent in If-None-Match"},
             401: {"description": "Not authenticated"},
         },
     )
@@ -21,6 +30,41 @@ class UserRankListView(generics.ListAPIView):
 
     serializer_class = UserRankSerializer
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
 
     def get_queryset(self):
-        return UserRank.objects.filter(user=self.request.user).select_related("tier")
+        # Join the tier and the user (rendered by its username) and load only the serialized columns
+        return (
+            UserRank.objects.filter(user=self.request.user)
+            .select_related("tier", "user")
+            .only(
+                "id",
+                "category",
+                "current_score",
+                "last_updated",
+                "tier__id",
+                "tier__name",
+                "tier__minimum_score",
+                "user__id",
+                "user__username",
+            )
+        )
+
+    def list(self, request, *args, **kwargs):
+        # Conditional GET: ranks only change when a finished session scores them or a tier is edited
+        etag = self._get_etag(request.user)
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = super().list(request, *args, **kwargs)
+
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    def _get_etag(self, user):
+        """Build a version tag from one aggregate over the user's ranks and the cached tier ladder"""
+        version = UserRank.objects.filter(user=user).aggregate(last_updated=Max("last_updated"), rank_count=Count("id"))
+        tiers = [(tier.id, tier.name, tier.minimum_score) for tier in get_tier_ladder()]
+        token = f"{user.id}|{user.username}|{version}|{tiers}"
+        return f'"{hashlib.blake2b(token.encode(), digest_size=12).hexdigest()}"'
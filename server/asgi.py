@@ -3,7 +3,6 @@ import os
 # Configure Django settings at the beginning
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "server.settings")
 
-from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
 
@@ -16,6 +15,7 @@ import devices.routing
 application = ProtocolTypeRouter(
     {
         "http": django_asgi_app,
-        "websocket": AuthMiddlewareStack(URLRouter(devices.routing.websocket_urlpatterns)),
+        # Devices authenticate with their API key in the consumer, so no session or user middleware is needed
+        "websocket": URLRouter(devices.routing.websocket_urlpatterns),
     }
 )
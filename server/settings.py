@@ -25,6 +25,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = "django-insecure-twj_7eei+txf38x%w&1&h3m4#+8f1gtuepu$34p7b%q!=k)-k-"
 
+# Key for the device API key digests stored in Device.api_key_hash.
+# Changing it invalidates every stored digest, so keep it stable once devices are registered.
+DEVICE_KEY_PEPPER = getenv("DEVICE_KEY_PEPPER", SECRET_KEY)
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = getenv("DEBUG", "True").lower() != "false"
 
@@ -59,12 +63,34 @@ INSTALLED_APPS = [
     "ranks.apps.RanksConfig",
 ]
 
+# Redis is optional: when REDIS_URL is set it backs both the channel layer and the cache
+REDIS_URL = getenv("REDIS_URL")
+
 # Channels settings
 ASGI_APPLICATION = "server.asgi.application"
 CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-    },
+    "default": (
+        {"BACKEND": "channels_redis.pubsub.RedisPubSubChannelLayer", "CONFIG": {"hosts": [REDIS_URL]}}
+        if REDIS_URL
+        else {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    ),
+}
+# Let sync views PUBLISH group messages straight to Redis instead of going through async_to_sync.
+# Only takes effect with the Redis pub/sub channel layer above.
+CHANNELS_DIRECT_PUBLISH = getenv("CHANNELS_DIRECT_PUBLISH", "False").lower() == "true"
+
+# Finalize stopped sessions (metrics and rank updates) on a worker thread instead of inside the stop request
+SESSION_FINALIZE_IN_BACKGROUND = getenv("SESSION_FINALIZE_IN_BACKGROUND", "False").lower() == "true"
+SESSION_FINALIZE_WORKERS = int(getenv("SESSION_FINALIZE_WORKERS", "2"))
+
+# Cache settings
+# Use Redis when REDIS_URL is configured, otherwise fall back to a per-process memory cache
+CACHES = {
+    "default": (
+        {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": REDIS_URL}
+        if REDIS_URL
+        else {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    ),
 }
 
 ACCESS_TOKEN_LIFETIME = timedelta(days=9999)
@@ -1,20 +1,20 @@
 #!/usr/bin/env python3
+import io
 import os
 import sys
 
 import qrcode
 
 
-def generate_qrcode(text, filename="qrcode.png"):
+def make_qrcode_png(text):
     """
-    Generate a QR code from the given text and save it to a file.
+    Generate a QR code from the given text as an in-memory PNG image.
 
     Args:
         text: The string to encode in the QR code
-        filename: The file name to save the QR code image (default: qrcode.png)
 
     Returns:
-        Path to the saved QR code image
+        The PNG image bytes
     """
     # Create QR code instance
     qr = qrcode.QRCode(
@@ -31,8 +31,25 @@ def generate_qrcode(text, filename="qrcode.png"):
     # Create an image from the QR code
     img = qr.make_image(fill_color="black", back_color="white")
 
-    # Save the image
-    img.save(filename)
+    # Encode the image as PNG without going through a file
+    buffer = io.BytesIO()
+    img.save(buffer)
+    return buffer.getvalue()
+
+
+def generate_qrcode(text, filename="qrcode.png"):
+    """
+    Generate a QR code from the given text and save it to a file.
+
+    Args:
+        text: The string to encode in the QR code
+        filename: The file name to save the QR code image (default: qrcode.png)
+
+    Returns:
+        Path to the saved QR code image
+    """
+    with open(filename, "wb") as qr_file:
+        qr_file.write(make_qrcode_png(text))
     return os.path.abspath(filename)
 
 